@@ -0,0 +1,146 @@
+"""Concurrent booking stress test for controller.booking.book_slot().
+
+Many threads race to book a small pool of open slots. At the end every
+slot must hold at most one active appointment and every booked slot's
+availability must be consumed; the script reports both checks and the
+successful bookings per second.
+
+    python benchmarks/bench_booking.py --threads 16 --attempts 200
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--attempts", type=int, default=200, help="booking attempts per thread")
+    parser.add_argument("--doctors", type=int, default=5)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def seed(db, args):
+    from controller.model import User, Doctor, Patient, Doctor_availability
+    from controller.slots import SLOT_MAP, slot_start
+
+    db.session.execute(db.insert(User), [
+        dict(username=f"patient{i}", email=f"patient{i}@example.com", password="pw", role="patient")
+        for i in range(args.threads)
+    ] + [
+        dict(username=f"doctor{i}", email=f"doctor{i}@example.com", password="pw", role="doctor")
+        for i in range(args.doctors)
+    ])
+    users = {user.email: user.id for user in User.query}
+    db.session.execute(db.insert(Patient), [
+        dict(user_id=users[f"patient{i}@example.com"]) for i in range(args.threads)
+    ])
+    db.session.execute(db.insert(Doctor), [
+        dict(user_id=users[f"doctor{i}@example.com"], department_id=1, blacklisted=False)
+        for i in range(args.doctors)
+    ])
+
+    doctors = [doctor.id for doctor in Doctor.query]
+    first_day = date.today() + timedelta(days=1)
+    slots = []
+    rows = []
+    for doctor_id in doctors:
+        for offset in range(args.days):
+            day = first_day + timedelta(days=offset)
+            for label in SLOT_MAP.values():
+                start = slot_start(day, label)
+                slots.append((doctor_id, start, label))
+                rows.append(dict(doctor_id=doctor_id, date=day, time_slot=label,
+                                 slot_start=start, is_available=True))
+    db.session.execute(db.insert(Doctor_availability), rows)
+    db.session.commit()
+    return [patient.id for patient in Patient.query], slots
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="bench_booking_")
+    os.environ["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(workdir, "bench.sqlite3")
+    os.environ.setdefault("SECRET_KEY", "bench")
+
+    from main import app
+    from controller.database import db
+    from controller.booking import SlotUnavailable, book_slot
+
+    with app.app_context():
+        patients, slots = seed(db, args)
+
+    outcomes = {"booked": 0, "unavailable": 0, "error": 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.threads)
+
+    def worker(index):
+        rng = random.Random(args.seed + index)
+        patient_id = patients[index % len(patients)]
+        with app.app_context():
+            barrier.wait()
+            for _ in range(args.attempts):
+                doctor_id, start, label = rng.choice(slots)
+                try:
+                    book_slot(patient_id, doctor_id, start, label)
+                    outcome = "booked"
+                except SlotUnavailable:
+                    outcome = "unavailable"
+                except Exception:
+                    db.session.rollback()
+                    outcome = "error"
+                with lock:
+                    outcomes[outcome] += 1
+            db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        double_booked = db.session.execute(db.text("""
+            SELECT count(*) FROM (
+                SELECT doctor_id, slot_start FROM appointments
+                WHERE status IN ('Booked', 'Pending')
+                GROUP BY doctor_id, slot_start HAVING count(*) > 1
+            )
+        """)).scalar()
+        unconsumed = db.session.execute(db.text("""
+            SELECT count(*) FROM appointments
+            JOIN doctor_availability USING (doctor_id, slot_start)
+            WHERE appointments.status IN ('Booked', 'Pending')
+              AND doctor_availability.is_available = 1
+        """)).scalar()
+
+    attempts = args.threads * args.attempts
+    print(f"slots offered:        {len(slots)}")
+    print(f"attempts:             {attempts} across {args.threads} threads")
+    print(f"booked:               {outcomes['booked']}")
+    print(f"rejected (taken):     {outcomes['unavailable']}")
+    print(f"errors:               {outcomes['error']}")
+    print(f"double bookings:      {double_booked}")
+    print(f"unconsumed bookings:  {unconsumed}")
+    print(f"elapsed:              {elapsed:.2f}s")
+    print(f"attempts/sec:         {attempts / elapsed:.0f}")
+    print(f"bookings/sec:         {outcomes['booked'] / elapsed:.0f}")
+
+    if double_booked or unconsumed or outcomes["booked"] > len(slots):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
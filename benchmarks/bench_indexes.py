@@ -0,0 +1,181 @@
+"""Query plans and latency for the hot lookup filters, with and without the
+indexes declared on the models.
+
+Seeds a throwaway SQLite database, drops the model indexes to mimic a
+database file created before they existed, times each lookup, then runs
+the migration step that creates them and times the lookups again.
+
+    python benchmarks/bench_indexes.py --appointments 200000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=100000)
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def seed(db, args, rng):
+    from controller.model import User, Doctor, Patient, Appointment, Doctor_availability, PatientHistory
+    from controller.slots import slot_start
+
+    users = [
+        dict(username=f"patient{i}", email=f"patient{i}@example.com", password=f"pw{i}", role="patient")
+        for i in range(args.patients)
+    ] + [
+        dict(username=f"doctor{i}", email=f"doctor{i}@example.com", password="temp123", role="doctor")
+        for i in range(args.doctors)
+    ]
+    db.session.execute(db.insert(User), users)
+    first_user = db.session.query(db.func.min(User.id)).filter(User.email == "patient0@example.com").scalar()
+
+    db.session.execute(db.insert(Patient), [dict(user_id=first_user + i) for i in range(args.patients)])
+    db.session.execute(db.insert(Doctor), [
+        dict(user_id=first_user + args.patients + i, department_id=i % 5 + 1, blacklisted=False)
+        for i in range(args.doctors)
+    ])
+
+    slots = ["08:00 - 12:00", "12:00 - 16:00", "16:00 - 20:00", "20:00 - 00:00"]
+    statuses = ["Booked", "Completed", "Cancelled", "Pending"]
+    dates = [date(2025, 1, 1) + timedelta(days=i) for i in range(365)]
+    held = set()
+
+    def appointment():
+        day, label = rng.choice(dates), rng.choice(slots)
+        doctor_id = rng.randint(1, args.doctors)
+        status = rng.choice(statuses)
+        # uq_appointments_active_slot allows one Booked/Pending appointment
+        # per doctor and slot; a repeat pick becomes a cancellation.
+        if status in ("Booked", "Pending"):
+            if (doctor_id, day, label) in held:
+                status = "Cancelled"
+            held.add((doctor_id, day, label))
+        return dict(
+            patient_id=rng.randint(1, args.patients),
+            doctor_id=doctor_id,
+            date=day,
+            time=label,
+            slot_start=slot_start(day, label),
+            status=status,
+        )
+
+    db.session.execute(db.insert(Appointment), [appointment() for _ in range(args.appointments)])
+    db.session.execute(db.insert(Doctor_availability), [
+        dict(doctor_id=doctor, date=day, time_slot=label, slot_start=slot_start(day, label),
+             is_available=rng.random() < 0.5)
+        for doctor in range(1, args.doctors + 1)
+        for day in dates[:28]
+        for label in slots
+    ])
+    db.session.execute(db.insert(PatientHistory), [
+        dict(patient_id=rng.randint(1, args.patients), visit_type="Consultation",
+             diagnosis="Routine", created_by=first_user + args.patients)
+        for _ in range(args.appointments // 2)
+    ])
+    db.session.commit()
+    return dates, slots
+
+
+def hot_queries(db, args, dates, slots):
+    from controller.model import User, Appointment, Doctor_availability, PatientHistory
+    from controller.slots import slot_start
+
+    return {
+        "book_appointment conflict": lambda rng: Appointment.query.filter(
+            Appointment.doctor_id == rng.randint(1, args.doctors),
+            Appointment.slot_start == slot_start(rng.choice(dates), rng.choice(slots)),
+            Appointment.status.in_(["Booked", "Pending"]),
+        ),
+        "patient_history appointments": lambda rng: Appointment.query.filter(
+            Appointment.patient_id == rng.randint(1, args.patients),
+            Appointment.status == "Completed",
+        ),
+        "doctor availability": lambda rng: Doctor_availability.query.filter(
+            Doctor_availability.doctor_id == rng.randint(1, args.doctors),
+            Doctor_availability.is_available == True,
+            Doctor_availability.slot_start >= slot_start(dates[7], slots[0]),
+        ).order_by(Doctor_availability.slot_start),
+        "patient history records": lambda rng: PatientHistory.query.filter_by(
+            patient_id=rng.randint(1, args.patients),
+        ).order_by(PatientHistory.date.desc()),
+        "login lookup": lambda rng: User.query.filter_by(
+            username=f"patient{rng.randrange(args.patients)}",
+        ).order_by(User.id).limit(1),
+        "role count": lambda rng: User.query.filter_by(role="patient").with_entities(db.func.count()),
+    }
+
+
+def query_plan(db, query):
+    sql = str(query.statement.compile(db.engine, compile_kwargs={"literal_binds": True}))
+    rows = db.session.execute(db.text("EXPLAIN QUERY PLAN " + sql)).all()
+    return "; ".join(row[-1] for row in rows)
+
+
+def measure(db, queries, args):
+    results = {}
+    for name, build in queries.items():
+        rng = random.Random(args.seed)
+        print(f"  {name:30s} {query_plan(db, build(rng))}")
+        timings = []
+        for _ in range(args.repeat):
+            query = build(rng)
+            start = time.perf_counter()
+            query.all()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = statistics.median(timings)
+    return results
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="bench_indexes_")
+    os.environ["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(workdir, "bench.sqlite3")
+    os.environ.setdefault("SECRET_KEY", "bench")
+
+    from main import app
+    from controller.database import db
+    from controller.migrations import run_migrations
+
+    with app.app_context():
+        dates, slots = seed(db, args, random.Random(args.seed))
+
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(bind=db.engine)
+        db.session.execute(db.text("PRAGMA user_version = 0"))
+        db.session.commit()
+
+        queries = hot_queries(db, args, dates, slots)
+        print("Before (no secondary indexes):")
+        before = measure(db, queries, args)
+
+        run_migrations()
+        db.session.execute(db.text("ANALYZE"))
+        db.session.commit()
+
+        print("After migration:")
+        after = measure(db, queries, args)
+
+    print()
+    print(f"{'query':32s} {'before ms':>10s} {'after ms':>10s} {'speedup':>8s}")
+    for name in queries:
+        print(f"{name:32s} {before[name]:10.3f} {after[name]:10.3f} {before[name] / after[name]:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
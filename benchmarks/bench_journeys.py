@@ -0,0 +1,198 @@
+"""Latency of the main user journeys, end to end through the Flask app.
+
+Seeds a database at the requested scale with controller.datagen, then drives the real routes
+through the Flask test client: login, patient dashboard, department
+browse, next-slot lookup, booking, doctor dashboard and admin dashboard.
+Prints p50/p95/p99 latency and requests/sec per journey and writes them to
+--output as JSON. With --baseline, a journey whose p95 is more than
+--tolerance (and at least --min-delta-ms) slower than in the baseline
+file fails the run.
+
+    python benchmarks/bench_journeys.py --appointments 100000 --output after.json
+    python benchmarks/bench_journeys.py --appointments 100000 --baseline after.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = "bench-password"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--appointments", type=int, default=1000)
+    parser.add_argument("--patients", type=int, help="default: appointments / 10, at least 100")
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--days", type=int, default=14, help="days of future availability")
+    parser.add_argument("--requests", type=int, default=200, help="requests per journey")
+    parser.add_argument("--database", help="SQLite file to seed (default: a temporary one)")
+    parser.add_argument("--output", default="bench_journeys.json")
+    parser.add_argument("--baseline", help="earlier --output file to compare p95 against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="ignore p95 slowdowns smaller than this")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed requests per journey")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def seed(args):
+    from controller.counters import reconcile_counters
+    from controller.datagen import generate_data
+
+    generate_data(
+        patients=args.patients, doctors=args.doctors, appointments=args.appointments,
+        days_ahead=args.days, seed=args.seed, password=PASSWORD, progress=None
+    )
+    reconcile_counters()
+
+
+def bookable_doctor_username(db):
+    from controller.model import User, Doctor
+
+    return db.session.query(User.username).join(Doctor, Doctor.user_id == User.id).filter(
+        Doctor.blacklisted == False).order_by(Doctor.id).limit(1).scalar()
+
+
+def open_slots(db):
+    from controller.model import Doctor_availability
+
+    return db.session.query(
+        Doctor_availability.doctor_id, Doctor_availability.date, Doctor_availability.time_slot
+    ).filter(Doctor_availability.is_available == True).all()
+
+
+def percentile(timings, pct):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_journey(requests, warmup, make_request):
+    for i in range(warmup):
+        make_request(requests + i)
+
+    timings, failures = [], 0
+    started = time.perf_counter()
+    for i in range(requests):
+        began = time.perf_counter()
+        response = make_request(i)
+        timings.append((time.perf_counter() - began) * 1000)
+        failures += response.status_code >= 400
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "failures": failures,
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "rps": round(requests / elapsed, 1),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def logged_in_client(app, username):
+    client = app.test_client()
+    response = client.post("/login", data={"username": username, "password": PASSWORD})
+    assert response.status_code == 302, f"login as {username} failed"
+    return client
+
+
+def main():
+    args = parse_args()
+    args.patients = args.patients or max(100, args.appointments // 10)
+    path = args.database or os.path.join(tempfile.mkdtemp(prefix="bench_journeys_"), "bench.sqlite3")
+    os.environ["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.abspath(path)
+    os.environ.setdefault("SECRET_KEY", "bench")
+
+    from main import app
+    from controller.database import db
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        seeded = time.perf_counter()
+        seed(args)
+        print(f"seeded {args.appointments} appointments, {args.patients} patients, "
+              f"{args.doctors} doctors in {time.perf_counter() - seeded:.1f}s")
+        slots = open_slots(db)
+        doctor_username = bookable_doctor_username(db)
+    rng.shuffle(slots)
+
+    patient = logged_in_client(app, "patient0")
+    doctor = logged_in_client(app, doctor_username)
+    admin = app.test_client()
+    admin.post("/login", data={"username": "Superuser", "password": "1234567890"})
+    anonymous = app.test_client()
+
+    def login(i):
+        return anonymous.post("/login", data={
+            "username": f"patient{i % args.patients}", "password": PASSWORD})
+
+    def book(i):
+        doctor_id, day, label = slots[i % len(slots)]
+        return patient.post(f"/patient/book_appointment/{doctor_id}",
+                            data={"date_time": f"{day.isoformat()}_{label}"})
+
+    journeys = {
+        "login": login,
+        "patient_dashboard": lambda i: patient.get("/patient/dashboard"),
+        "department_browse": lambda i: patient.get(f"/patient/view_doctors/{i % 5 + 1}"),
+        "next_slots": lambda i: patient.get(f"/api/departments/{i % 5 + 1}/next_slots?limit=10"),
+        "booking": book,
+        "doctor_dashboard": lambda i: doctor.get("/doctor"),
+        "admin_dashboard": lambda i: admin.get("/admin"),
+    }
+
+    results = {}
+    print(f"{'journey':18s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'req/s':>8s} {'fail':>5s}")
+    for name, make_request in journeys.items():
+        results[name] = result = run_journey(args.requests, args.warmup, make_request)
+        print(f"{name:18s} {result['p50_ms']:8.2f} {result['p95_ms']:8.2f} "
+              f"{result['p99_ms']:8.2f} {result['rps']:8.1f} {result['failures']:5d}")
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "scale": {key: getattr(args, key) for key in ("appointments", "patients", "doctors", "days", "requests")},
+        "journeys": results,
+    }
+    with open(args.output, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)["journeys"]
+        regressions = [
+            (name, baseline[name]["p95_ms"], result["p95_ms"])
+            for name, result in results.items()
+            if name in baseline
+            and result["p95_ms"] > baseline[name]["p95_ms"] * (1 + args.tolerance)
+            and result["p95_ms"] - baseline[name]["p95_ms"] > args.min_delta_ms
+        ]
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: p95 {before:.2f} ms -> {after:.2f} ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Logins per second at different password hashing costs.
+
+For each --settings entry (method:cost) the users' passwords are rehashed
+at that cost, then --concurrency threads log in --logins times in total
+through the Flask test client while one more thread keeps requesting the
+home page. Prints logins/sec, login p50/p95, how many logins were turned
+away with 503 by the bounded verify pool, and the home page p95 during the
+storm (which should stay low however expensive the hash is).
+
+    python benchmarks/bench_logins.py --settings scrypt:16384,pbkdf2_sha256:600000
+    python benchmarks/bench_logins.py --workers 2 --queue 4 --concurrency 16
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = "bench-password"
+DEFAULT_SETTINGS = "scrypt:4096,scrypt:16384,scrypt:32768,pbkdf2_sha256:100000,pbkdf2_sha256:600000"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--settings", default=DEFAULT_SETTINGS, help="comma-separated method:cost")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=200, help="logins per setting")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads")
+    parser.add_argument("--workers", type=int, default=4, help="PASSWORD_VERIFY_WORKERS")
+    parser.add_argument("--queue", type=int, default=16, help="PASSWORD_VERIFY_QUEUE")
+    parser.add_argument("--wait", type=float, default=2.0, help="PASSWORD_VERIFY_WAIT")
+    return parser.parse_args()
+
+
+def p95(timings):
+    return statistics.quantiles(timings, n=100)[94] if len(timings) > 1 else timings[0]
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="bench_logins_")
+    os.environ["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(workdir, "bench.sqlite3")
+    os.environ.setdefault("SECRET_KEY", "bench")
+
+    from sqlalchemy import update
+    from main import app
+    from controller.database import db
+    from controller.model import User
+    from controller.passwords import configure_passwords, hash_passwords
+    from controller.sql_scripts import bulk_insert
+
+    app.config.update(PASSWORD_VERIFY_WORKERS=args.workers, PASSWORD_VERIFY_QUEUE=args.queue,
+                      PASSWORD_VERIFY_WAIT=args.wait)
+    with app.app_context():
+        bulk_insert(User, [
+            dict(username=f"login{i}", email=f"login{i}@example.com", password=PASSWORD, role="patient")
+            for i in range(args.users)
+        ])
+        user_ids = db.session.scalars(db.select(User.id).where(User.username.like("login%"))).all()
+
+    print(f"{args.logins} logins per setting, {args.concurrency} clients, "
+          f"pool {args.workers} workers + {args.queue} queued")
+    print(f"{'setting':22s} {'logins/s':>9s} {'p50 ms':>8s} {'p95 ms':>8s} {'503s':>5s} {'home p95':>9s}")
+
+    for setting in args.settings.split(","):
+        method, _, cost = setting.partition(":")
+        app.config.update(PASSWORD_HASH_METHOD=method, PASSWORD_HASH_COST=cost or None)
+        configure_passwords(app)
+        with app.app_context():
+            hashes = hash_passwords([PASSWORD] * len(user_ids))
+            db.session.execute(update(User), [
+                dict(id=user_id, password=password_hash) for user_id, password_hash in zip(user_ids, hashes)
+            ])
+            db.session.commit()
+
+        timings, rejected, home = [], [], []
+        lock = threading.Lock()
+        storming = threading.Event()
+        storming.set()
+
+        def log_in(i):
+            client = app.test_client()
+            began = time.perf_counter()
+            response = client.post("/login", data={"username": f"login{i % args.users}", "password": PASSWORD})
+            elapsed = (time.perf_counter() - began) * 1000
+            with lock:
+                if response.status_code == 503:
+                    rejected.append(i)
+                else:
+                    assert response.status_code == 302, f"login failed with {response.status_code}"
+                    timings.append(elapsed)
+
+        def browse():
+            client = app.test_client()
+            while storming.is_set():
+                began = time.perf_counter()
+                client.get("/")
+                home.append((time.perf_counter() - began) * 1000)
+                time.sleep(0.005)
+
+        browser = threading.Thread(target=browse)
+        browser.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as clients:
+            list(clients.map(log_in, range(args.logins)))
+        elapsed = time.perf_counter() - started
+        storming.clear()
+        browser.join()
+
+        print(f"{setting:22s} {len(timings) / elapsed:9.1f} {statistics.median(timings):8.1f} "
+              f"{p95(timings):8.1f} {len(rejected):5d} {p95(home):9.2f}")
+
+
+if __name__ == "__main__":
+    main()
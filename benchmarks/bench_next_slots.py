@@ -0,0 +1,105 @@
+"""Latency of the department "next available slot" endpoint.
+
+Seeds doctors across the five default departments with a month of
+availability, prints the query plan for get_next_open_slots() and times
+/api/departments/<id>/next_slots through the Flask test client against
+--target-ms at the 95th percentile.
+
+    python benchmarks/bench_next_slots.py --doctors 2000 --days 60
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--doctors", type=int, default=500)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--open-ratio", type=float, default=0.3)
+    parser.add_argument("--repeat", type=int, default=300)
+    parser.add_argument("--target-ms", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def seed(db, args, rng):
+    from controller.model import User, Doctor, Doctor_availability
+    from controller.slots import SLOT_MAP, slot_start
+
+    db.session.execute(db.insert(User), [
+        dict(username=f"doctor{i}", email=f"doctor{i}@example.com", password="pw", role="doctor")
+        for i in range(args.doctors)
+    ] + [dict(username="bench", email="bench@example.com", password="pw", role="patient")])
+    users = {user.email: user.id for user in User.query}
+    db.session.execute(db.insert(Doctor), [
+        dict(user_id=users[f"doctor{i}@example.com"], department_id=i % 5 + 1,
+             blacklisted=rng.random() < 0.05)
+        for i in range(args.doctors)
+    ])
+
+    today = date.today()
+    rows = []
+    for doctor in Doctor.query:
+        for offset in range(args.days):
+            day = today + timedelta(days=offset)
+            for label in SLOT_MAP.values():
+                rows.append(dict(doctor_id=doctor.id, date=day, time_slot=label,
+                                 slot_start=slot_start(day, label),
+                                 is_available=rng.random() < args.open_ratio))
+    db.session.execute(db.insert(Doctor_availability), rows)
+    db.session.execute(db.text("ANALYZE"))
+    db.session.commit()
+    return users["bench@example.com"], len(rows)
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="bench_next_slots_")
+    os.environ["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(workdir, "bench.sqlite3")
+    os.environ.setdefault("SECRET_KEY", "bench")
+
+    from main import app
+    from controller.database import db
+    from controller.sql_scripts import next_open_slots_query
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        user_id, total_rows = seed(db, args, rng)
+        query = next_open_slots_query(1, datetime.now())
+        sql = str(query.statement.compile(db.engine, compile_kwargs={"literal_binds": True}))
+        plan = db.session.execute(db.text("EXPLAIN QUERY PLAN " + sql)).all()
+        print(f"availability rows: {total_rows}")
+        print("plan: " + "; ".join(row[-1] for row in plan))
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+        session["role"] = "patient"
+
+    timings = []
+    for _ in range(args.repeat):
+        department = rng.randint(1, 5)
+        start = (date.today() + timedelta(days=rng.randrange(args.days))).isoformat()
+        began = time.perf_counter()
+        response = client.get(f"/api/departments/{department}/next_slots?from={start}&limit=10")
+        timings.append((time.perf_counter() - began) * 1000)
+        assert response.status_code == 200
+
+    p50 = statistics.median(timings)
+    p95 = statistics.quantiles(timings, n=100)[94]
+    print(f"p50 {p50:.2f} ms, p95 {p95:.2f} ms, target p95 < {args.target_ms} ms")
+    if p95 > args.target_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Cost of a patient registration: commit per record vs one unit of work.
+
+Registers --count patients (a User row, then its Patient row) three ways
+and reports transactions committed and latency per registration:
+
+  per-record    add_record() twice, one commit each (the old behaviour)
+  unit-of-work  both add_record() calls inside unit_of_work(), one commit
+  bulk          bulk_insert() of every User, then every Patient
+
+Under the default profile (rollback journal, synchronous=FULL) SQLite
+fsyncs the journal and the database on every commit, so transactions per
+registration is the number of fsync rounds each one waits for.
+
+    python benchmarks/bench_registration.py --count 500 --profile default
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=300)
+    parser.add_argument("--profile", default="default")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="bench_registration_")
+    os.environ["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(workdir, "bench.sqlite3")
+    os.environ["SQLITE_PROFILE"] = args.profile
+    os.environ.setdefault("SECRET_KEY", "bench")
+
+    from sqlalchemy import event
+    from main import app
+    from controller.database import db
+    from controller.model import User, Patient
+    from controller.sql_scripts import add_record, bulk_insert, unit_of_work
+
+    commits = []
+    with app.app_context():
+        event.listen(db.engine, "commit", lambda conn: commits.append(1))
+
+        def user(prefix, i):
+            return dict(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com",
+                        password="pw", role="patient")
+
+        def per_record(i):
+            new_user = User(**user("record", i))
+            add_record(new_user)
+            add_record(Patient(user_id=new_user.id))
+
+        def batched(i):
+            with unit_of_work():
+                new_user = User(**user("batched", i))
+                add_record(new_user)
+                add_record(Patient(user_id=new_user.id))
+
+        print(f"{args.count} registrations, profile {args.profile}")
+        print(f"{'mode':14s} {'commits/reg':>12s} {'p50 ms':>8s} {'p95 ms':>8s} {'total s':>8s}")
+
+        for name, register in (("per-record", per_record), ("unit-of-work", batched)):
+            commits.clear()
+            timings = []
+            for i in range(args.count):
+                began = time.perf_counter()
+                register(i)
+                timings.append((time.perf_counter() - began) * 1000)
+                db.session.expunge_all()
+            print(f"{name:14s} {len(commits) / args.count:12.2f} "
+                  f"{statistics.median(timings):8.2f} {statistics.quantiles(timings, n=100)[94]:8.2f} "
+                  f"{sum(timings) / 1000:8.2f}")
+
+        commits.clear()
+        began = time.perf_counter()
+        bulk_insert(User, [user("bulk", i) for i in range(args.count)])
+        ids = db.session.scalars(db.select(User.id).where(User.username.like("bulk%"))).all()
+        bulk_insert(Patient, [dict(user_id=user_id) for user_id in ids])
+        elapsed = time.perf_counter() - began
+        print(f"{'bulk':14s} {len(commits) / args.count:12.2f} "
+              f"{elapsed * 1000 / args.count:8.2f} {'-':>8s} {elapsed:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Admin user search latency: the old ilike('%term%') scan against the
+FTS5-backed query_user_results(), at growing user counts.
+
+    python benchmarks/bench_search.py --sizes 10000 100000 500000
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def random_name(rng):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 9)))
+
+
+def grow_users(db, total, rng):
+    from controller.model import User
+
+    current = User.query.count()
+    batch = []
+    for i in range(current, total):
+        name = f"{random_name(rng)} {random_name(rng)}"
+        batch.append(dict(username=name, email=f"user{i}@example.com", password="pw", role="patient"))
+    if batch:
+        db.session.execute(db.insert(User), batch)
+        db.session.commit()
+
+
+def time_ms(fn, terms):
+    timings = []
+    for term in terms:
+        start = time.perf_counter()
+        fn(term)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), statistics.quantiles(timings, n=100)[94]
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="bench_search_")
+    os.environ["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(workdir, "bench.sqlite3")
+    os.environ.setdefault("SECRET_KEY", "bench")
+
+    from main import app
+    from controller.database import db
+    from controller.model import User
+    from controller.sql_scripts import query_user_results
+
+    def ilike_search(term):
+        return User.query.filter(
+            (User.username.ilike(f"%{term}%")) | (User.email.ilike(f"%{term}%"))
+        ).limit(20).all()
+
+    def fts_search(term):
+        return query_user_results(term).items
+
+    rng = random.Random(args.seed)
+    print(f"{'users':>8s} {'ilike p50':>10s} {'ilike p95':>10s} {'fts p50':>9s} {'fts p95':>9s}")
+    with app.app_context():
+        for size in args.sizes:
+            grow_users(db, size, rng)
+            terms = [random_name(rng)[:3] for _ in range(args.repeat)]
+            ilike = time_ms(ilike_search, terms)
+            fts = time_ms(fts_search, terms)
+            print(f"{size:8d} {ilike[0]:10.2f} {ilike[1]:10.2f} {fts[0]:9.2f} {fts[1]:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Mixed read/write throughput under each SQLite engine profile.
+
+For every profile in controller.config.SQLITE_PROFILES a fresh database is
+seeded and hammered for --seconds by reader threads (admin dashboard
+queries) and writer threads (one committed history record per write).
+Each profile runs in its own process, since the profile is fixed when the
+app is imported.
+
+    python benchmarks/bench_sqlite_profile.py --readers 8 --writers 4
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--profile", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def seed(db, patients):
+    from controller.model import User, Patient
+
+    db.session.execute(db.insert(User), [
+        dict(username=f"patient{i}", email=f"patient{i}@example.com", password="pw", role="patient")
+        for i in range(patients)
+    ])
+    db.session.execute(db.text("INSERT INTO patients (user_id) SELECT id FROM users WHERE role = 'patient'"))
+    db.session.commit()
+    return [patient.id for patient in Patient.query]
+
+
+def run_profile(args):
+    workdir = tempfile.mkdtemp(prefix="bench_profile_")
+    os.environ["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(workdir, "bench.sqlite3")
+    os.environ["SQLITE_PROFILE"] = args.profile
+    os.environ.setdefault("SECRET_KEY", "bench")
+
+    from main import app
+    from controller.database import db
+    from controller.model import PatientHistory
+    from controller.sql_scripts import add_record, get_registered_patients_data, get_all_patients
+
+    with app.app_context():
+        patients = seed(db, args.patients)
+
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def tally(key):
+        with lock:
+            counts[key] += 1
+
+    def reader(index):
+        rng = random.Random(index)
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                try:
+                    get_all_patients()
+                    get_registered_patients_data(per_page=rng.randint(10, 50))
+                    tally("reads")
+                except Exception:
+                    db.session.rollback()
+                    tally("errors")
+                db.session.remove()
+
+    def writer(index):
+        rng = random.Random(1000 + index)
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                try:
+                    add_record(PatientHistory(
+                        patient_id=rng.choice(patients),
+                        visit_type="Consultation",
+                        diagnosis="Routine"
+                    ))
+                    tally("writes")
+                except Exception:
+                    db.session.rollback()
+                    tally("errors")
+                db.session.remove()
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        "profile": args.profile,
+        "reads_per_sec": counts["reads"] / elapsed,
+        "writes_per_sec": counts["writes"] / elapsed,
+        "errors": counts["errors"],
+    }))
+
+
+def main():
+    args = parse_args()
+    if args.profile:
+        run_profile(args)
+        return
+
+    from controller.config import SQLITE_PROFILES
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds}s per profile")
+    print(f"{'profile':12s} {'reads/s':>10s} {'writes/s':>10s} {'errors':>8s}")
+    for name in SQLITE_PROFILES:
+        output = subprocess.run(
+            [sys.executable, __file__, "--profile", name,
+             "--readers", str(args.readers), "--writers", str(args.writers),
+             "--seconds", str(args.seconds), "--patients", str(args.patients)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{name:12s} {result['reads_per_sec']:10.0f} {result['writes_per_sec']:10.0f} {result['errors']:8d}")
+
+
+if __name__ == "__main__":
+    main()
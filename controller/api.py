@@ -0,0 +1,47 @@
+import hashlib
+import json
+from flask import current_app, request
+from controller.export import plain
+
+# Helpers for the /api/v1 JSON routes in main.py.
+#
+# Each route works out an ETag before it builds its payload: from a version
+# it already has (the reference-data snapshot, a doctor's
+# availability_version) or, failing that, from the lean rows it fetched.
+# When the client's If-None-Match matches, the route answers 304 without
+# serializing anything.
+
+API_VERSION = "v1"
+
+
+def row_dict(row):
+    """A flat query row (from a column projection) as a JSON-ready dict."""
+    return {key: plain(value) for key, value in row._mapping.items()}
+
+
+def etag_for(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def rows_etag(rows):
+    return etag_for(*(tuple(row) for row in rows))
+
+
+def not_modified(etag):
+    return etag in request.if_none_match
+
+
+def conditional_json(etag, build):
+    """304 if the client already holds ``etag``, else ``build()`` as JSON.
+
+    Responses are private and must be revalidated on every use, so a
+    poller pays one round trip and no body while nothing has changed.
+    """
+    if not_modified(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(
+            json.dumps(build(), separators=(",", ":")), mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,117 @@
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from sqlalchemy import delete, insert, update
+from controller.cache import invalidate
+from controller.database import db
+from controller.events import record_availability_event
+from controller.model import Doctor, Doctor_availability
+from controller.slot_calendar import refresh_day
+
+# Every change to a doctor's availability (the doctor editing their grid,
+# a booking taking a slot, a cancellation reopening one) bumps
+# Doctor.availability_version in the same transaction. Readers holding a
+# copy of the slots only need the doctor row to know whether it is stale.
+
+AVAILABILITY_DAYS = 7
+
+AvailableSlot = namedtuple("AvailableSlot", ["date", "time_slot", "slot_start"])
+
+# doctor_id -> (availability_version, since, [AvailableSlot, ...])
+_open_slots_cache = {}
+
+
+def bump_availability_version(doctor_ids):
+    db.session.execute(
+        update(Doctor)
+        .where(Doctor.id.in_(doctor_ids))
+        .values(availability_version=Doctor.availability_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    invalidate("availability")
+
+
+def start_of_today():
+    return datetime.combine(date.today(), datetime.min.time())
+
+
+def get_open_availability(doctor, since=None):
+    """Open slots for ``doctor`` from ``since`` (default: today) onwards.
+
+    Served from a per-process copy while ``doctor.availability_version``
+    matches the one it was built at, so a repeat visit to the booking page
+    costs no availability query.
+    """
+    since = since or start_of_today()
+    cached = _open_slots_cache.get(doctor.id)
+    if cached and cached[0] == doctor.availability_version and cached[1] == since:
+        return cached[2]
+
+    rows = (
+        db.session.query(
+            Doctor_availability.date,
+            Doctor_availability.time_slot,
+            Doctor_availability.slot_start
+        )
+        .filter(
+            Doctor_availability.doctor_id == doctor.id,
+            Doctor_availability.is_available == True,
+            Doctor_availability.slot_start >= since
+        )
+        .order_by(Doctor_availability.slot_start)
+    )
+    slots = [AvailableSlot(*row) for row in rows]
+    _open_slots_cache[doctor.id] = (doctor.availability_version, since, slots)
+    return slots
+
+
+def update_availability(doctor_id, wanted, window_start, window_end, held=()):
+    """Make the doctor's availability between ``window_start`` and
+    ``window_end`` match ``wanted`` ({slot_start: label}).
+
+    Only the difference against the stored rows is written: one DELETE for
+    slots that were dropped and one multi-row INSERT for new ones. Rows
+    that stay keep their state, so a slot that is already booked stays
+    taken. Slots in ``held`` are inserted as unavailable. Returns
+    (added, removed) counts; the caller commits.
+    """
+    current = dict(
+        db.session.query(Doctor_availability.slot_start, Doctor_availability.id)
+        .filter(
+            Doctor_availability.doctor_id == doctor_id,
+            Doctor_availability.slot_start >= window_start,
+            Doctor_availability.slot_start < window_end
+        )
+    )
+
+    removed = {start: row_id for start, row_id in current.items() if start not in wanted}
+    added = [
+        dict(
+            doctor_id=doctor_id,
+            date=start.date(),
+            time_slot=label,
+            slot_start=start,
+            is_available=start not in held
+        )
+        for start, label in wanted.items()
+        if start not in current and window_start <= start < window_end
+    ]
+
+    if removed:
+        db.session.execute(
+            delete(Doctor_availability).where(Doctor_availability.id.in_(removed.values()))
+        )
+    if added:
+        db.session.execute(insert(Doctor_availability), added)
+    if removed or added:
+        bump_availability_version({doctor_id})
+        record_availability_event(doctor_id)
+        touched = {start.date() for start in removed} | {row["date"] for row in added}
+        for day in sorted(touched):
+            refresh_day(doctor_id, day)
+
+    return len(added), len(removed)
+
+
+def availability_window(days=AVAILABILITY_DAYS):
+    start = start_of_today()
+    return start, start + timedelta(days=days)
@@ -0,0 +1,108 @@
+import time
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from controller.database import db
+from controller.model import Appointment, Doctor_availability
+from controller.availability import bump_availability_version
+from controller.slot_calendar import refresh_day
+from controller.tasks import queue_booking_notices
+
+# Statuses that hold a doctor's slot. At most one appointment per doctor and
+# slot_start may be in one of these, enforced by the partial unique index
+# uq_appointments_active_slot on the model.
+HOLDING_STATUSES = ("Booked", "Pending")
+
+LOCK_RETRIES = 5
+LOCK_BACKOFF = 0.05
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+def _claim_availability(doctor_id, start):
+    # Flip the open availability row to taken in a single conditional
+    # UPDATE. This is the first statement of the transaction, so it also
+    # takes SQLite's write lock up front (the same effect as BEGIN
+    # IMMEDIATE): a concurrent booking for the same slot waits here and
+    # then matches no rows.
+    result = db.session.execute(
+        update(Doctor_availability)
+        .where(
+            Doctor_availability.doctor_id == doctor_id,
+            Doctor_availability.slot_start == start,
+            Doctor_availability.is_available == True
+        )
+        .values(is_available=False)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+
+def book_slot(patient_id, doctor_id, start, label):
+    """Book ``doctor_id`` at ``start`` for ``patient_id`` and consume the
+    matching availability, all in one transaction.
+
+    The confirmation and reminder are queued in the same transaction.
+    Raises SlotUnavailable if the doctor isn't offering that slot or someone
+    else got it first. A "database is locked" error from a busy writer is
+    retried with backoff before giving up.
+    """
+    for attempt in range(LOCK_RETRIES):
+        try:
+            if not _claim_availability(doctor_id, start):
+                db.session.rollback()
+                raise SlotUnavailable("This slot is no longer available.")
+
+            appointment = Appointment(
+                patient_id=patient_id,
+                doctor_id=doctor_id,
+                date=start.date(),
+                time=label,
+                slot_start=start,
+                status="Booked"
+            )
+            db.session.add(appointment)
+            db.session.flush()
+            queue_booking_notices(appointment)
+            bump_availability_version({doctor_id})
+            refresh_day(doctor_id, start.date())
+            db.session.commit()
+            return appointment
+        except IntegrityError:
+            db.session.rollback()
+            raise SlotUnavailable("This slot is already booked.")
+        except OperationalError as error:
+            db.session.rollback()
+            if "locked" not in str(error) or attempt == LOCK_RETRIES - 1:
+                raise
+            time.sleep(LOCK_BACKOFF * (2 ** attempt))
+
+
+def cancel_booking(appointment):
+    """Cancel ``appointment`` and reopen the availability it was holding.
+    Runs in the caller's transaction; the caller commits."""
+    holding = appointment.status in HOLDING_STATUSES
+    appointment.status = "Cancelled"
+    if not holding or appointment.slot_start is None:
+        return
+    db.session.execute(
+        update(Doctor_availability)
+        .where(
+            Doctor_availability.doctor_id == appointment.doctor_id,
+            Doctor_availability.slot_start == appointment.slot_start
+        )
+        .values(is_available=True)
+        .execution_options(synchronize_session=False)
+    )
+    bump_availability_version({appointment.doctor_id})
+    refresh_day(appointment.doctor_id, appointment.slot_start.date())
+
+
+def held_slot_starts(doctor_id):
+    rows = db.session.query(Appointment.slot_start).filter(
+        Appointment.doctor_id == doctor_id,
+        Appointment.status.in_(HOLDING_STATUSES),
+        Appointment.slot_start.isnot(None)
+    )
+    return {start for start, in rows}
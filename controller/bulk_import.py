@@ -0,0 +1,308 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+from sqlalchemy import tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from controller.availability import bump_availability_version
+from controller.booking import HOLDING_STATUSES
+from controller.database import db
+from controller.model import User, Patient, Doctor, Department, Appointment, Doctor_availability
+from controller.passwords import hash_passwords, parse_hash
+from controller.slot_calendar import rebuild_calendar
+from controller.slots import parse_date, slot_start
+from controller.sql_scripts import bulk_insert, mark_counters_stale, unit_of_work
+
+# Loads onboarding files straight into the tables. Rows are read lazily and
+# handled IMPORT_CHUNK_SIZE at a time: one query finds which rows of the
+# chunk already exist (by email, or by natural key for availability and
+# appointments), the rest go in as executemany batches, and the chunk is
+# committed before the next is read. Memory stays flat however large the
+# file is, and a failed chunk never leaves half a chunk behind.
+#
+# Files are CSV with a header row, or JSON Lines (.jsonl / .ndjson), with
+# these fields:
+#
+#   patients      username, email, password, contact, age, gender
+#   doctors       username, email, password, contact, department, specialization
+#   availability  doctor_email, date, time_slot, is_available
+#   appointments  patient_email, doctor_email, date, time, status, diagnosis
+#
+# Doctors and patients are matched on email, and a row whose username is
+# already taken (in the tables or earlier in the file) is skipped too; a
+# department named in the doctors file is created if it doesn't exist yet. Passwords are hashed on
+# the way in, each distinct one once per chunk on the password pool;
+# values that are already hashes are stored as they are. A lower
+# --password-cost makes large imports fast, and such rows are rehashed at
+# the current cost on the user's first login.
+#
+# Booked or Pending appointments take their slot: the matching availability
+# rows are marked unavailable, as a booking through the site would, and the
+# slot calendar is rebuilt once the file is in.
+
+IMPORT_CHUNK_SIZE = 5000
+DEFAULT_PASSWORD = "temp123"
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+
+
+class ImportStats:
+    def __init__(self, kind):
+        self.kind = kind
+        self.read = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def __str__(self):
+        rate = self.read / self.elapsed if self.elapsed else 0
+        return (f"{self.kind}: {self.read} read, {self.inserted} inserted, "
+                f"{self.skipped} skipped ({rate:.0f} rows/s)")
+
+
+def read_rows(path):
+    """Yield each record of a CSV or JSON Lines file as a dict."""
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline="", encoding="utf-8") as handle:
+        if extension in (".jsonl", ".ndjson"):
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(handle)
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def as_bool(value):
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def ids_by_email(emails, profile):
+    """email -> profile id (Patient or Doctor) for the given emails."""
+    if not emails:
+        return {}
+    rows = (
+        db.session.query(User.email, profile.id)
+        .join(profile, profile.user_id == User.id)
+        .filter(User.email.in_(emails))
+    )
+    return dict(rows)
+
+
+def existing_values(column, values):
+    """The subset of ``values`` already stored in the users ``column``."""
+    if not values:
+        return set()
+    return set(db.session.scalars(db.select(column).where(column.in_(values))))
+
+
+def department_ids(names):
+    known = {name: id for id, name in db.session.query(Department.id, Department.name)}
+    missing = sorted({name for name in names if name and name not in known})
+    if missing:
+        bulk_insert(Department, [dict(name=name) for name in missing])
+        known = {name: id for id, name in db.session.query(Department.id, Department.name)}
+    return known
+
+
+def hash_chunk_passwords(users, cost=None):
+    plain = sorted({user["password"] for user in users if parse_hash(user["password"]) is None})
+    hashes = dict(zip(plain, hash_passwords(plain, cost)))
+    for user in users:
+        user["password"] = hashes.get(user["password"], user["password"])
+
+
+def import_people(chunk, stats, role, password_cost=None):
+    users, profiles = [], {}
+    emails = existing_values(User.email, {clean(row.get("email")) for row in chunk} - {None})
+    usernames = existing_values(User.username, {clean(row.get("username")) for row in chunk} - {None})
+
+    for row in chunk:
+        email = clean(row.get("email"))
+        username = clean(row.get("username"))
+        if not email or not username or email in emails or username in usernames or email in profiles:
+            stats.skipped += 1
+            continue
+        usernames.add(username)
+        users.append(dict(
+            username=username,
+            email=email,
+            password=clean(row.get("password")) or DEFAULT_PASSWORD,
+            role=role,
+            contact=clean(row.get("contact")),
+            age=as_int(row.get("age")),
+            gender=clean(row.get("gender"))
+        ))
+        profiles[email] = row
+
+    if not users:
+        return
+
+    hash_chunk_passwords(users, password_cost)
+
+    departments = {}
+    if role == "doctor":
+        departments = department_ids({clean(row.get("department")) for row in profiles.values()})
+
+    with unit_of_work():
+        bulk_insert(User, users)
+        user_ids = dict(db.session.query(User.email, User.id).filter(User.email.in_(list(profiles))))
+        if role == "doctor":
+            rows = []
+            for email, row in profiles.items():
+                department = clean(row.get("department"))
+                rows.append(dict(
+                    user_id=user_ids[email],
+                    department_id=departments.get(department),
+                    specialization=clean(row.get("specialization")) or department,
+                    blacklisted=False,
+                    availability_version=0
+                ))
+            bulk_insert(Doctor, rows)
+        else:
+            bulk_insert(Patient, [dict(user_id=user_ids[email]) for email in profiles])
+    stats.inserted += len(users)
+
+
+def mark_slots_held(held):
+    """Mark the availability rows for ``held`` (doctor_id, slot_start)
+    pairs unavailable and bump those doctors' availability_version."""
+    taken = db.session.execute(
+        update(Doctor_availability)
+        .where(
+            tuple_(Doctor_availability.doctor_id, Doctor_availability.slot_start).in_(list(held)),
+            Doctor_availability.is_available.is_(True)
+        )
+        .values(is_available=False)
+        .returning(Doctor_availability.doctor_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    if taken:
+        bump_availability_version(set(taken))
+
+
+def import_availability(chunk, stats):
+    doctors = ids_by_email({clean(row.get("doctor_email")) for row in chunk} - {None}, Doctor)
+    wanted = {}
+    for row in chunk:
+        doctor_id = doctors.get(clean(row.get("doctor_email")))
+        day = parse_date(clean(row.get("date")))
+        label = clean(row.get("time_slot"))
+        start = slot_start(day, label)
+        if doctor_id is None or start is None or (doctor_id, start) in wanted:
+            stats.skipped += 1
+            continue
+        wanted[(doctor_id, start)] = dict(
+            doctor_id=doctor_id, date=day, time_slot=label, slot_start=start,
+            is_available=as_bool(row.get("is_available", True))
+        )
+
+    if wanted:
+        existing = set(map(tuple,
+            db.session.query(Doctor_availability.doctor_id, Doctor_availability.slot_start)
+            .filter(tuple_(Doctor_availability.doctor_id, Doctor_availability.slot_start).in_(list(wanted)))
+        ))
+        stats.skipped += len(existing)
+        rows = [row for key, row in wanted.items() if key not in existing]
+        if rows:
+            with unit_of_work():
+                bulk_insert(Doctor_availability, rows)
+                bump_availability_version({row["doctor_id"] for row in rows})
+            stats.inserted += len(rows)
+
+
+def import_appointments(chunk, stats):
+    patients = ids_by_email({clean(row.get("patient_email")) for row in chunk} - {None}, Patient)
+    doctors = ids_by_email({clean(row.get("doctor_email")) for row in chunk} - {None}, Doctor)
+    wanted = {}
+    for row in chunk:
+        patient_id = patients.get(clean(row.get("patient_email")))
+        doctor_id = doctors.get(clean(row.get("doctor_email")))
+        day = parse_date(clean(row.get("date")))
+        label = clean(row.get("time"))
+        start = slot_start(day, label)
+        key = (patient_id, doctor_id, start)
+        if patient_id is None or doctor_id is None or start is None or key in wanted:
+            stats.skipped += 1
+            continue
+        wanted[key] = dict(
+            patient_id=patient_id, doctor_id=doctor_id, date=day, time=label,
+            slot_start=start, status=clean(row.get("status")) or "Completed",
+            diagnosis=clean(row.get("diagnosis"))
+        )
+
+    if not wanted:
+        return
+
+    existing = set(map(tuple,
+        db.session.query(Appointment.patient_id, Appointment.doctor_id, Appointment.slot_start)
+        .filter(tuple_(Appointment.patient_id, Appointment.doctor_id, Appointment.slot_start).in_(list(wanted)))
+    ))
+    rows = [row for key, row in wanted.items() if key not in existing]
+    inserted = 0
+    if rows:
+        # A second active booking for a slot that is already held would
+        # break uq_appointments_active_slot; such rows are skipped.
+        with unit_of_work():
+            inserted = db.session.execute(
+                sqlite_insert(Appointment.__table__).on_conflict_do_nothing(), rows
+            ).rowcount
+            held = {(row["doctor_id"], row["slot_start"]) for row in rows if row["status"] in HOLDING_STATUSES}
+            if held:
+                mark_slots_held(held)
+            mark_counters_stale()
+    stats.inserted += inserted
+    stats.skipped += len(wanted) - inserted
+
+
+IMPORTERS = {
+    "patients": lambda chunk, stats, **options: import_people(chunk, stats, "patient", **options),
+    "doctors": lambda chunk, stats, **options: import_people(chunk, stats, "doctor", **options),
+    "availability": import_availability,
+    "appointments": import_appointments,
+}
+
+
+def import_file(kind, path, chunk_size=IMPORT_CHUNK_SIZE, progress=None, password_cost=None):
+    """Stream ``path`` into the tables for ``kind`` (a key of IMPORTERS),
+    calling ``progress(stats)`` after each committed chunk."""
+    importer = IMPORTERS[kind]
+    options = dict(password_cost=password_cost) if kind in ("patients", "doctors") else {}
+    stats = ImportStats(kind)
+    for chunk in chunks(read_rows(path), chunk_size):
+        stats.read += len(chunk)
+        importer(chunk, stats, **options)
+        db.session.expunge_all()
+        if progress:
+            progress(stats)
+
+    if kind in ("availability", "appointments") and stats.inserted:
+        with unit_of_work():
+            rebuild_calendar(db.session.connection())
+    return stats
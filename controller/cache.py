@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, make_response, request
+from markupsafe import Markup
+from sqlalchemy import event
+from controller.database import db
+from controller.model import User, Department, Doctor, Doctor_availability
+
+# Rendered-output cache for pages and fragments built only from slowly
+# changing data (departments, doctor rosters). Every entry's key includes
+# the current version of each kind of data it was rendered from; a write
+# that changes that data bumps the version once its transaction commits,
+# so stale entries are simply never looked up again and age out of the LRU.
+#
+# Versions live in this process. ORM writes to the tracked models are
+# picked up from the session automatically; Core statements (bulk inserts,
+# the conditional UPDATEs in booking) call invalidate() themselves. Other
+# worker processes only see a change once their copy's TTL runs out.
+
+PAGE_CACHE_SIZE = 512
+PAGE_CACHE_TTL = 300
+
+TRACKED_MODELS = {
+    Department: "departments",
+    Doctor: "doctors",
+    Doctor_availability: "availability",
+}
+
+data_versions = {name: 0 for name in TRACKED_MODELS.values()}
+
+
+class LRUCache:
+    """Thread-safe LRU mapping whose entries also expire ``ttl`` seconds
+    after they were stored."""
+
+    def __init__(self, maxsize=PAGE_CACHE_SIZE, ttl=PAGE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if time.monotonic() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+render_cache = LRUCache()
+
+
+def configure_cache(app):
+    render_cache.maxsize = int(app.config.get("PAGE_CACHE_SIZE", PAGE_CACHE_SIZE))
+    render_cache.ttl = float(app.config.get("PAGE_CACHE_TTL", PAGE_CACHE_TTL))
+
+
+def versions_of(names):
+    return tuple(data_versions[name] for name in names)
+
+
+def invalidate(*names):
+    """Bump the version of each named kind of data when the current
+    transaction commits (dropped again if it rolls back)."""
+    db.session.info.setdefault("invalidate", set()).update(names)
+
+
+def invalidate_model(model):
+    name = TRACKED_MODELS.get(model)
+    if name:
+        invalidate(name)
+
+
+@event.listens_for(db.session, "after_flush")
+def collect_invalidations(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        name = TRACKED_MODELS.get(type(obj))
+        # Rosters show the doctor's username, which lives on User.
+        if isinstance(obj, User) and obj.role == "doctor":
+            name = "doctors"
+        if name:
+            session.info.setdefault("invalidate", set()).add(name)
+
+
+@event.listens_for(db.session, "after_commit")
+def apply_invalidations(session):
+    for name in session.info.pop("invalidate", ()):
+        data_versions[name] += 1
+
+
+@event.listens_for(db.session, "after_rollback")
+def discard_invalidations(session):
+    session.info.pop("invalidate", None)
+
+
+def cached_fragment(name, depends_on, render, *key):
+    """Markup from ``render()``, reused until any of ``depends_on`` changes.
+
+    ``key`` distinguishes variants of the same fragment (e.g. an id).
+    """
+    cache_key = ("fragment", name, key, versions_of(depends_on))
+    html = render_cache.get(cache_key)
+    if html is None:
+        html = Markup(render())
+        render_cache.set(cache_key, html)
+    return html
+
+
+def cached_page(*depends_on):
+    """Cache a GET view's whole response body per path and query string.
+
+    Only for pages whose output doesn't depend on who is asking.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET" or current_app.config.get("PAGE_CACHE_TTL") == 0:
+                return view(*args, **kwargs)
+
+            cache_key = (
+                "page", request.endpoint, request.path,
+                tuple(sorted(request.args.items(multi=True))),
+                versions_of(depends_on)
+            )
+            cached = render_cache.get(cache_key)
+            if cached is not None:
+                body, mimetype = cached
+                return current_app.response_class(body, mimetype=mimetype)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                render_cache.set(cache_key, (response.get_data(), response.mimetype))
+            return response
+        return wrapper
+    return decorator
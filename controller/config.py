@@ -2,3 +2,35 @@ class config:
     SECRET_KEY = '12345'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///database.sqlite3'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLITE_PROFILE = 'production'
+
+
+# Engine profiles for SQLite, picked with SQLITE_PROFILE. "pragmas" are run
+# on every new DB-API connection; "engine_options" go to create_engine()
+# through SQLALCHEMY_ENGINE_OPTIONS.
+SQLITE_PROFILES = {
+    # Plain sqlite3 defaults: rollback journal, full fsync on every commit.
+    'default': {
+        'pragmas': {},
+        'engine_options': {},
+    },
+    # WAL lets readers run alongside the single writer, NORMAL sync only
+    # fsyncs at checkpoints, and busy_timeout makes a second writer wait
+    # for the lock instead of failing with "database is locked".
+    'production': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 5000,
+            'cache_size': -64000,
+            'mmap_size': 268435456,
+            'temp_store': 'MEMORY',
+        },
+        'engine_options': {
+            'pool_size': 10,
+            'max_overflow': 10,
+            'pool_timeout': 30,
+            'connect_args': {'timeout': 5},
+        },
+    },
+}
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import attributes
+from controller.database import db
+from controller.jobs import enqueue
+from controller.model import User, Doctor, Appointment, DashboardCounter
+from controller.sql_scripts import (
+    ACTIVE_APPOINTMENT_STATUSES,
+    get_all_doctors,
+    get_all_patients,
+    get_all_active_appointments,
+)
+
+# Totals shown on /admin. Each one is kept in dashboard_counters and nudged
+# inside the same transaction as the write that changes it, so reading the
+# dashboard is a single primary-key scan instead of three COUNT(*)s.
+COUNTERS = {
+    "doctors": get_all_doctors,
+    "patients": get_all_patients,
+    "appointments": get_all_active_appointments,
+}
+
+RECONCILE_INTERVAL = timedelta(minutes=5)
+# Past this many intervals (or after mark_counters_stale()) the stored
+# totals are recounted inline instead of waiting for the worker.
+INLINE_RECONCILE_FACTOR = 4
+
+counters_table = DashboardCounter.__table__
+
+
+def reconcile_counters():
+    """Recount every total from the source tables and store the result.
+
+    Queued as a job whenever the stored values are older than
+    ``COUNTER_RECONCILE_SECONDS``, which bounds how long any drift from
+    writes that bypass the ORM can last.
+    """
+    now = datetime.utcnow()
+    totals = {}
+    for name, count in COUNTERS.items():
+        totals[name] = count()
+        row = db.session.get(DashboardCounter, name)
+        if row is None:
+            row = DashboardCounter(name=name)
+            db.session.add(row)
+        row.value = totals[name]
+        row.reconciled_at = now
+    db.session.commit()
+    return totals
+
+
+def reconcile_interval():
+    seconds = current_app.config.get("COUNTER_RECONCILE_SECONDS")
+    if seconds is None:
+        return RECONCILE_INTERVAL
+    return timedelta(seconds=int(seconds))
+
+
+def read_counters():
+    rows = DashboardCounter.query.all()
+    if {row.name for row in rows} != set(COUNTERS):
+        return reconcile_counters()
+
+    oldest = min(row.reconciled_at for row in rows)
+    age = datetime.utcnow() - oldest
+    if age > reconcile_interval() * INLINE_RECONCILE_FACTOR:
+        return reconcile_counters()
+    if age > reconcile_interval():
+        enqueue("reconcile_counters", dedupe_key="reconcile_counters")
+        db.session.commit()
+
+    return {row.name: row.value for row in rows}
+
+
+def _is_active(status):
+    return status in ACTIVE_APPOINTMENT_STATUSES
+
+
+def _committed_value(obj, key):
+    history = attributes.get_history(obj, key)
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(obj, key)
+
+
+def _counter_deltas(session):
+    deltas = {name: 0 for name in COUNTERS}
+
+    for obj in session.new:
+        if isinstance(obj, User) and obj.role == "patient":
+            deltas["patients"] += 1
+        elif isinstance(obj, Doctor) and not obj.blacklisted:
+            deltas["doctors"] += 1
+        elif isinstance(obj, Appointment) and _is_active(obj.status):
+            deltas["appointments"] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, User) and _committed_value(obj, "role") == "patient":
+            deltas["patients"] -= 1
+        elif isinstance(obj, Doctor) and not _committed_value(obj, "blacklisted"):
+            deltas["doctors"] -= 1
+        elif isinstance(obj, Appointment) and _is_active(_committed_value(obj, "status")):
+            deltas["appointments"] -= 1
+
+    for obj in session.dirty:
+        if isinstance(obj, Doctor):
+            was, now = bool(_committed_value(obj, "blacklisted")), bool(obj.blacklisted)
+            if was != now:
+                deltas["doctors"] += -1 if now else 1
+        elif isinstance(obj, Appointment):
+            was, now = _committed_value(obj, "status"), obj.status
+            deltas["appointments"] += _is_active(now) - _is_active(was)
+
+    return {name: delta for name, delta in deltas.items() if delta}
+
+
+@event.listens_for(db.session, "after_flush")
+def apply_counter_deltas(session, flush_context):
+    # Same connection and transaction as the flush itself, so a rollback
+    # of the write also rolls back its counter update.
+    connection = session.connection()
+    for name, delta in _counter_deltas(session).items():
+        connection.execute(
+            counters_table.update()
+            .where(counters_table.c.name == name)
+            .values(value=counters_table.c.value + delta)
+        )
@@ -1,3 +1,127 @@
+import time
+from flask import current_app, g, has_request_context, session as flask_session
+from flask.globals import app_ctx
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import scoped_session, sessionmaker
+from controller.config import SQLITE_PROFILES
 
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy()
+
+# Heavy read-only helpers in sql_scripts run on read_session() instead of
+# db.session. It is bound to a second engine: SQLALCHEMY_READ_URI if set
+# (e.g. a replica), otherwise a read-only (mode=ro) connection pool on the
+# same SQLite file, so dashboard reads don't queue behind booking writes
+# for a pooled connection.
+read_sessions = scoped_session(
+    sessionmaker(autoflush=False),
+    scopefunc=lambda: id(app_ctx._get_current_object())
+)
+
+# Pragmas that only make sense on a connection allowed to write.
+WRITE_ONLY_PRAGMAS = ("journal_mode", "synchronous")
+
+READ_YOUR_WRITES_SECONDS = 5
+
+
+def sqlite_profile(name):
+    if name not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLITE_PROFILE {name!r}; expected one of {sorted(SQLITE_PROFILES)}")
+    return SQLITE_PROFILES[name]
+
+
+def set_sqlite_pragmas(engine, pragmas):
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+def is_file_sqlite(url):
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def create_read_engine(app, profile):
+    read_uri = app.config.get("SQLALCHEMY_READ_URI")
+    if not read_uri:
+        if not is_file_sqlite(db.engine.url):
+            return None
+        read_uri = f"sqlite:///file:{db.engine.url.database}?mode=ro&uri=true"
+
+    engine = create_engine(read_uri, **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    if engine.dialect.name == "sqlite":
+        pragmas = {
+            name: value for name, value in profile["pragmas"].items()
+            if name not in WRITE_ONLY_PRAGMAS
+        }
+        pragmas["query_only"] = "ON"
+        set_sqlite_pragmas(engine, pragmas)
+    return engine
+
+
+def init_db(app):
+    """Bind ``db`` to ``app`` using the engine profile named by the app's
+    SQLITE_PROFILE setting, and set up the read-only engine behind
+    read_session() unless READ_ROUTING is off."""
+    profile = sqlite_profile(app.config.get("SQLITE_PROFILE", "default"))
+    uri = app.config.get("SQLALCHEMY_DATABASE_URI") or ""
+
+    # In-memory databases get a single static connection from
+    # Flask-SQLAlchemy, which has no pool to size.
+    if uri.startswith("sqlite") and ":memory:" not in uri and uri.rstrip("/") != "sqlite:":
+        options = dict(profile["engine_options"])
+        options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+    db.init_app(app)
+
+    with app.app_context():
+        if db.engine.dialect.name == "sqlite" and profile["pragmas"]:
+            set_sqlite_pragmas(db.engine, profile["pragmas"])
+
+        read_engine = None
+        if app.config.get("READ_ROUTING", True):
+            read_engine = create_read_engine(app, profile)
+
+        app.extensions["read_engine"] = read_engine
+        read_sessions.configure(bind=read_engine)
+
+    @app.teardown_appcontext
+    def remove_read_session(exc):
+        read_sessions.remove()
+
+
+def all_engines():
+    engines = [db.engine]
+    read_engine = current_app.extensions.get("read_engine")
+    if read_engine is not None:
+        engines.append(read_engine)
+    return engines
+
+
+def reads_from_primary():
+    # Read-your-writes: once this request has committed, and for
+    # READ_YOUR_WRITES_SECONDS afterwards for the same browser session (the
+    # redirect after a POST), reads stay on the primary so they can't miss
+    # the write on a lagging replica.
+    if current_app.extensions.get("read_engine") is None:
+        return True
+    if not has_request_context():
+        return False
+    if g.get("wrote_to_primary"):
+        return True
+    return flask_session.get("read_primary_until", 0) > time.time()
+
+
+def read_session():
+    return db.session if reads_from_primary() else read_sessions()
+
+
+@event.listens_for(db.session, "after_commit")
+def remember_write(session):
+    if has_request_context():
+        window = current_app.config.get("READ_YOUR_WRITES_SECONDS", READ_YOUR_WRITES_SECONDS)
+        g.wrote_to_primary = True
+        flask_session["read_primary_until"] = time.time() + float(window)
@@ -0,0 +1,221 @@
+import random
+import time
+from datetime import date, datetime, timedelta
+from controller.database import db
+from controller.model import User, Patient, Doctor, Department, Appointment, Doctor_availability, PatientHistory
+from controller.passwords import hash_password
+from controller.slot_calendar import rebuild_calendar
+from controller.slots import SLOT_MAP, slot_start
+from controller.sql_scripts import bulk_insert, mark_counters_stale, unit_of_work
+
+# Synthetic data for load and performance testing. Everything is drawn
+# from one random.Random(seed), so the same arguments give the same rows,
+# and every table is written with bulk_insert() in large batches.
+#
+# The shapes are meant to look like a real hospital rather than a uniform
+# grid: a few departments hold most of the doctors, doctors differ in how
+# much of their week they open up, a minority of patients account for most
+# visits, and past appointments are mostly completed with some cancelled.
+
+DEPARTMENTS = [
+    ("General Medicine", "General health"),
+    ("Cardiology", "Heart and cardiovascular system"),
+    ("Orthopedics", "Bones and muscles"),
+    ("Neurology", "Nervous system"),
+    ("Oncology", "Cancer treatment"),
+    ("Pediatrics", "Care for children"),
+    ("Dermatology", "Skin conditions"),
+    ("Psychiatry", "Mental health"),
+    ("Radiology", "Medical imaging"),
+    ("ENT", "Ear, nose and throat"),
+]
+
+VISIT_TYPES = (("in_person", 80), ("telemedicine", 15), ("emergency", 5))
+DIAGNOSES = (
+    "Routine check-up", "Hypertension", "Type 2 diabetes", "Seasonal influenza",
+    "Migraine", "Lower back pain", "Asthma", "Anxiety", "Dermatitis",
+    "Fractured wrist", "Sinusitis", "Iron deficiency anaemia",
+)
+PAST_STATUSES = (("Completed", 85), ("Cancelled", 15))
+BLACKLISTED_SHARE = 0.03
+GENERATE_CHUNK_SIZE = 20000
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return lambda: rng.choices(values, weights)[0]
+
+
+def skewed_index(rng, size):
+    # Squaring a uniform draw puts most of the mass near zero, so low
+    # indexes (the "frequent" patients) are picked far more often.
+    return int(size * rng.random() ** 2)
+
+
+def ensure_departments(count):
+    existing = {name for name, in db.session.query(Department.name)}
+    missing = [
+        dict(name=name, description=description)
+        for name, description in DEPARTMENTS[:count] if name not in existing
+    ]
+    bulk_insert(Department, missing)
+    return db.session.scalars(db.select(Department.id).order_by(Department.id)).all()[:count]
+
+
+def insert_people(prefix, role, count, rng, password, chunk_size):
+    first = db.session.scalar(db.select(db.func.max(User.id))) or 0
+    rows = []
+    for i in range(count):
+        rows.append(dict(
+            username=f"{prefix}{i}",
+            email=f"{prefix}{i}@example.com",
+            password=password,
+            role=role,
+            contact=f"9{rng.randrange(10 ** 9):09d}",
+            age=int(rng.triangular(1, 95, 38)) if role == "patient" else rng.randint(28, 67),
+            gender=rng.choice(("F", "M"))
+        ))
+    bulk_insert(User, rows, chunk_size)
+    return db.session.scalars(
+        db.select(User.id).where(User.id > first, User.role == role).order_by(User.id)
+    ).all()
+
+
+def generate_data(patients=1000, doctors=50, departments=5, appointments=10000,
+                  history_per_patient=2.0, days_ahead=14, days_back=365,
+                  future_share=0.05, seed=1, password="password",
+                  chunk_size=GENERATE_CHUNK_SIZE, progress=print):
+    """Fill every table with deterministic synthetic data and return the
+    row counts written.
+
+    Users are named ``patient<i>`` / ``doctor<i>`` with ``password``,
+    hashed once and shared by every generated user.
+    ``future_share`` of the appointments are upcoming bookings that take an
+    open slot from the generated availability; the rest are spread over the
+    last ``days_back`` days.
+    """
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    counts = {}
+    labels = list(SLOT_MAP.values())
+
+    def step(name, rows):
+        counts[name] = rows
+        if progress:
+            progress(f"{name}: {rows} rows ({time.perf_counter() - started:.1f}s)")
+
+    password = hash_password(password)
+    department_ids = ensure_departments(departments)
+    # Department k gets weight 1/(k+1), so the first few hold most doctors.
+    department_weights = [1 / (rank + 1) for rank in range(len(department_ids))]
+
+    patient_users = insert_people("patient", "patient", patients, rng, password, chunk_size)
+    bulk_insert(Patient, [dict(user_id=user_id) for user_id in patient_users], chunk_size)
+    patient_ids = db.session.scalars(
+        db.select(Patient.id).where(Patient.user_id >= patient_users[0]).order_by(Patient.id)
+    ).all() if patient_users else []
+    step("patients", len(patient_ids))
+
+    doctor_users = insert_people("doctor", "doctor", doctors, rng, password, chunk_size)
+    doctor_rows = []
+    names = dict(db.session.query(Department.id, Department.name).filter(Department.id.in_(department_ids)))
+    for user_id in doctor_users:
+        department_id = rng.choices(department_ids, department_weights)[0]
+        doctor_rows.append(dict(
+            user_id=user_id, department_id=department_id, specialization=names[department_id],
+            blacklisted=rng.random() < BLACKLISTED_SHARE, availability_version=0
+        ))
+    bulk_insert(Doctor, doctor_rows, chunk_size)
+    doctor_ids = db.session.scalars(
+        db.select(Doctor.id).where(Doctor.user_id.in_(doctor_users)).order_by(Doctor.id)
+    ).all() if doctor_users else []
+    doctor_user = dict(zip(doctor_ids, doctor_users))
+    step("doctors", len(doctor_ids))
+
+    # Availability: each doctor opens a personal share of their slots
+    # (beta-distributed, most around 40%) for the next days_ahead days.
+    today = date.today()
+    now = datetime.now()
+    open_slots = []
+    availability = []
+    for doctor_id in doctor_ids:
+        openness = rng.betavariate(2, 3)
+        for offset in range(days_ahead):
+            day = today + timedelta(days=offset)
+            for label in labels:
+                start = slot_start(day, label)
+                is_open = start > now and rng.random() < openness
+                availability.append(dict(doctor_id=doctor_id, date=day, time_slot=label,
+                                         slot_start=start, is_available=is_open))
+                if is_open:
+                    open_slots.append(len(availability) - 1)
+
+    # Upcoming bookings consume open slots, exactly as book_slot() would,
+    # but never more than half of them.
+    future = min(int(appointments * future_share), len(open_slots) // 2) if patient_ids else 0
+    appointment_rows = []
+    for index in rng.sample(open_slots, future):
+        slot = availability[index]
+        slot["is_available"] = False
+        appointment_rows.append(dict(
+            patient_id=patient_ids[skewed_index(rng, len(patient_ids))],
+            doctor_id=slot["doctor_id"], date=slot["date"], time=slot["time_slot"],
+            slot_start=slot["slot_start"], status="Booked", diagnosis=None
+        ))
+    bulk_insert(Doctor_availability, availability, chunk_size)
+    step("availability", len(availability))
+    del availability, open_slots
+
+    past_slots = [
+        (day, label, slot_start(day, label))
+        for day in (today - timedelta(days=offset) for offset in range(1, days_back + 1))
+        for label in labels
+    ]
+    past_status = weighted(rng, PAST_STATUSES)
+    with unit_of_work():
+        bulk_insert(Appointment, appointment_rows, chunk_size)
+        written = len(appointment_rows)
+        appointment_rows = []
+        if doctor_ids and patient_ids:
+            for _ in range(appointments - future):
+                day, label, start = rng.choice(past_slots)
+                status = past_status()
+                appointment_rows.append(dict(
+                    patient_id=patient_ids[skewed_index(rng, len(patient_ids))],
+                    doctor_id=rng.choice(doctor_ids), date=day, time=label,
+                    slot_start=start, status=status,
+                    diagnosis=rng.choice(DIAGNOSES) if status == "Completed" else None
+                ))
+                if len(appointment_rows) == chunk_size:
+                    written += bulk_insert(Appointment, appointment_rows, chunk_size)
+                    appointment_rows = []
+        written += bulk_insert(Appointment, appointment_rows, chunk_size)
+    step("appointments", written)
+
+    # History: a Poisson-ish number of records per patient around
+    # history_per_patient, each written by one of the doctors.
+    visit_type = weighted(rng, VISIT_TYPES)
+    with unit_of_work():
+        rows, written = [], 0
+        for patient_id in patient_ids if doctor_ids else ():
+            for _ in range(int(rng.expovariate(1 / history_per_patient)) if history_per_patient else 0):
+                rows.append(dict(
+                    patient_id=patient_id,
+                    visit_type=visit_type(),
+                    diagnosis=rng.choice(DIAGNOSES),
+                    created_by=doctor_user[rng.choice(doctor_ids)],
+                    date=now - timedelta(days=rng.randint(1, days_back), minutes=rng.randrange(1440))
+                ))
+                if len(rows) == chunk_size:
+                    written += bulk_insert(PatientHistory, rows, chunk_size)
+                    rows = []
+        written += bulk_insert(PatientHistory, rows, chunk_size)
+    step("history", written)
+
+    with unit_of_work():
+        rebuild_calendar(db.session.connection())
+        mark_counters_stale()
+    db.session.execute(db.text("ANALYZE"))
+    db.session.commit()
+    step("total", sum(counts.values()))
+    return counts
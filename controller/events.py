@@ -0,0 +1,188 @@
+import json
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, or_
+from sqlalchemy.orm import Session, attributes
+from controller.database import db
+from controller.model import Appointment, AppointmentEvent
+
+# Change feed for appointments and availability. Every booking, status
+# change (cancelled, completed, ...) and availability save appends a row to
+# appointment_events in the same transaction as the change, so the feed
+# never shows a write that was rolled back. Clients remember the last event
+# id they saw and ask only for newer rows: a range read on
+# (doctor_id, id) or (patient_id, id).
+#
+# Appointment changes made through the ORM are picked up from the session;
+# availability is written with Core statements, so update_availability()
+# calls record_availability_event() itself.
+#
+# A stream or a long poll holds a server thread for as long as it waits,
+# so at most EVENT_MAX_WAITERS of them wait at once: past that a stream is
+# refused with 503 and a long poll answers straight away. The pages poll
+# without waiting; streams are for servers with async workers.
+
+EVENT_BATCH = 100
+EVENT_POLL_SECONDS = 2
+EVENT_STREAM_SECONDS = 55
+EVENT_HEARTBEAT_SECONDS = 15
+LONG_POLL_MAX_SECONDS = 30
+EVENT_MAX_WAITERS = 8
+
+_waiters = threading.BoundedSemaphore(EVENT_MAX_WAITERS)
+
+events_table = AppointmentEvent.__table__
+
+
+def _status_before(obj):
+    history = attributes.get_history(obj, "status")
+    if history.deleted:
+        return history.deleted[0]
+    return obj.status
+
+
+@event.listens_for(db.session, "after_flush")
+def record_appointment_events(session, flush_context):
+    changed = [obj for obj in session.new if isinstance(obj, Appointment)]
+    changed += [
+        obj for obj in session.dirty
+        if isinstance(obj, Appointment) and _status_before(obj) != obj.status
+    ]
+    if not changed:
+        return
+
+    now = datetime.utcnow()
+    session.connection().execute(events_table.insert(), [
+        dict(
+            kind=(appointment.status or "Pending").lower(),
+            appointment_id=appointment.id,
+            doctor_id=appointment.doctor_id,
+            patient_id=appointment.patient_id,
+            slot_start=appointment.slot_start,
+            status=appointment.status,
+            created_at=now
+        )
+        for appointment in changed
+    ])
+
+
+def record_availability_event(doctor_id):
+    db.session.execute(events_table.insert().values(
+        kind="availability", doctor_id=doctor_id, created_at=datetime.utcnow()
+    ))
+
+
+def prune_events(older_than):
+    """Delete events created before ``older_than``; returns the count."""
+    result = db.session.execute(
+        events_table.delete().where(events_table.c.created_at < older_than))
+    db.session.commit()
+    return result.rowcount
+
+
+def subscriber_filter(doctor_id=None, patient_id=None):
+    if doctor_id is not None and patient_id is not None:
+        return or_(AppointmentEvent.doctor_id == doctor_id, AppointmentEvent.patient_id == patient_id)
+    if doctor_id is not None:
+        return AppointmentEvent.doctor_id == doctor_id
+    return AppointmentEvent.patient_id == patient_id
+
+
+def feed_session():
+    # Each feed read gets a short session of its own (on the read engine
+    # when there is one): a stream sleeps between polls and must neither
+    # hold a pooled connection nor keep reading from an old snapshot, and
+    # the request's own session stays untouched.
+    return Session(current_app.extensions.get("read_engine") or db.engine)
+
+
+def events_since(after_id, doctor_id=None, patient_id=None, limit=EVENT_BATCH):
+    """Events for the subscriber with id > ``after_id``, oldest first."""
+    with feed_session() as session:
+        rows = (
+            session.query(
+                AppointmentEvent.id,
+                AppointmentEvent.kind,
+                AppointmentEvent.appointment_id,
+                AppointmentEvent.doctor_id,
+                AppointmentEvent.patient_id,
+                AppointmentEvent.slot_start,
+                AppointmentEvent.status,
+                AppointmentEvent.created_at
+            )
+            .filter(subscriber_filter(doctor_id, patient_id), AppointmentEvent.id > after_id)
+            .order_by(AppointmentEvent.id)
+            .limit(limit)
+            .all()
+        )
+    return [event_dict(row) for row in rows]
+
+
+def latest_event_id(doctor_id=None, patient_id=None):
+    with feed_session() as session:
+        return session.query(db.func.max(AppointmentEvent.id)).filter(
+            subscriber_filter(doctor_id, patient_id)).scalar() or 0
+
+
+def event_dict(row):
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in row._mapping.items()
+    }
+
+
+def acquire_waiter():
+    """Take one of the EVENT_MAX_WAITERS places; False if all are taken."""
+    return _waiters.acquire(blocking=False)
+
+
+def release_waiter():
+    _waiters.release()
+
+
+def wait_for_events(after_id, timeout, doctor_id=None, patient_id=None):
+    """Long poll: return as soon as there are events after ``after_id``,
+    or an empty list once ``timeout`` seconds have passed. Without a free
+    waiter place it only looks once."""
+    if timeout <= 0 or not acquire_waiter():
+        return events_since(after_id, doctor_id, patient_id)
+    try:
+        deadline = time.monotonic() + min(timeout, LONG_POLL_MAX_SECONDS)
+        while True:
+            events = events_since(after_id, doctor_id, patient_id)
+            if events or time.monotonic() >= deadline:
+                return events
+            time.sleep(min(EVENT_POLL_SECONDS, max(deadline - time.monotonic(), 0)))
+    finally:
+        release_waiter()
+
+
+def event_stream(after_id, doctor_id=None, patient_id=None, duration=EVENT_STREAM_SECONDS):
+    """Server-Sent Events for the subscriber, starting after ``after_id``.
+
+    Ends after ``duration`` seconds; EventSource reconnects by itself and
+    sends Last-Event-ID, so the client resumes exactly where it stopped.
+    """
+    deadline = time.monotonic() + duration
+    last_sent = time.monotonic()
+    yield f"retry: {EVENT_POLL_SECONDS * 1000}\n\n"
+    while time.monotonic() < deadline:
+        events = events_since(after_id, doctor_id, patient_id)
+        for item in events:
+            after_id = item["id"]
+            yield f"id: {item['id']}\nevent: {item['kind']}\ndata: {json.dumps(item)}\n\n"
+        if events:
+            last_sent = time.monotonic()
+            if len(events) == EVENT_BATCH:
+                continue
+        elif time.monotonic() - last_sent >= EVENT_HEARTBEAT_SECONDS:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+        time.sleep(EVENT_POLL_SECONDS)
+
+
+def configure_events(app):
+    global _waiters
+    _waiters = threading.BoundedSemaphore(int(app.config.get("EVENT_MAX_WAITERS", EVENT_MAX_WAITERS)))
@@ -0,0 +1,146 @@
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from sqlalchemy.orm import aliased
+from controller.database import db, read_session
+from controller.model import User, Patient, Doctor, Department, Appointment, PatientHistory
+
+# Reporting exports. Each dataset is a flat column projection (no ORM
+# objects, no relationship loads) run with yield_per, so rows come off the
+# cursor EXPORT_BATCH at a time and are written out as they arrive; an
+# export holds one batch in memory however many rows match.
+
+EXPORT_BATCH = 1000
+EXPORT_FORMATS = ("csv", "ndjson")
+
+PatientUser = aliased(User)
+DoctorUser = aliased(User)
+
+
+def day_start(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+def appointments_query(start=None, end=None, doctor_id=None, department_id=None):
+    query = (
+        db.select(
+            Appointment.id,
+            Appointment.date,
+            Appointment.time,
+            Appointment.slot_start,
+            Appointment.status,
+            Appointment.diagnosis,
+            Appointment.patient_id,
+            PatientUser.username.label("patient"),
+            Appointment.doctor_id,
+            DoctorUser.username.label("doctor"),
+            Department.name.label("department"),
+        )
+        .outerjoin(Patient, Patient.id == Appointment.patient_id)
+        .outerjoin(PatientUser, PatientUser.id == Patient.user_id)
+        .outerjoin(Doctor, Doctor.id == Appointment.doctor_id)
+        .outerjoin(DoctorUser, DoctorUser.id == Doctor.user_id)
+        .outerjoin(Department, Department.id == Doctor.department_id)
+        .order_by(Appointment.slot_start, Appointment.id)
+    )
+    if start:
+        query = query.where(Appointment.slot_start >= day_start(start))
+    if end:
+        query = query.where(Appointment.slot_start < day_start(end + timedelta(days=1)))
+    if doctor_id:
+        query = query.where(Appointment.doctor_id == doctor_id)
+    if department_id:
+        query = query.where(Doctor.department_id == department_id)
+    return query
+
+
+def history_query(start=None, end=None, doctor_id=None, department_id=None):
+    # History rows point at the authoring user, so the doctor and
+    # department filters go through that user's doctor profile.
+    query = (
+        db.select(
+            PatientHistory.id,
+            PatientHistory.date,
+            PatientHistory.visit_type,
+            PatientHistory.diagnosis,
+            PatientHistory.patient_id,
+            PatientUser.username.label("patient"),
+            Doctor.id.label("doctor_id"),
+            DoctorUser.username.label("doctor"),
+            Department.name.label("department"),
+        )
+        .outerjoin(Patient, Patient.id == PatientHistory.patient_id)
+        .outerjoin(PatientUser, PatientUser.id == Patient.user_id)
+        .outerjoin(DoctorUser, DoctorUser.id == PatientHistory.created_by)
+        .outerjoin(Doctor, Doctor.user_id == PatientHistory.created_by)
+        .outerjoin(Department, Department.id == Doctor.department_id)
+        .order_by(PatientHistory.date, PatientHistory.id)
+    )
+    if start:
+        query = query.where(PatientHistory.date >= day_start(start))
+    if end:
+        query = query.where(PatientHistory.date < day_start(end + timedelta(days=1)))
+    if doctor_id:
+        query = query.where(Doctor.id == doctor_id)
+    if department_id:
+        query = query.where(Doctor.department_id == department_id)
+    return query
+
+
+DATASETS = {
+    "appointments": appointments_query,
+    "history": history_query,
+}
+
+
+def export_batches(dataset, **filters):
+    """Yield the column names of ``dataset``, then the matching rows in
+    lists of up to EXPORT_BATCH, streamed from the database cursor."""
+    query = DATASETS[dataset](**filters)
+    result = read_session().execute(query.execution_options(yield_per=EXPORT_BATCH))
+    yield tuple(result.keys())
+    yield from result.partitions()
+
+
+def plain(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def to_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    batches = iter(batches)
+    writer.writerow(next(batches))
+    for batch in batches:
+        writer.writerows([plain(value) for value in row] for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, when nothing matched.
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def to_ndjson(batches):
+    batches = iter(batches)
+    columns = next(batches)
+    for batch in batches:
+        yield "".join(
+            json.dumps({name: plain(value) for name, value in zip(columns, row)}) + "\n"
+            for row in batch
+        )
+
+
+WRITERS = {
+    "csv": (to_csv, "text/csv"),
+    "ndjson": (to_ndjson, "application/x-ndjson"),
+}
+
+
+def export_lines(dataset, fmt, **filters):
+    """(generator of text chunks, mimetype) for ``dataset`` in ``fmt``."""
+    writer, mimetype = WRITERS[fmt]
+    return writer(export_batches(dataset, **filters)), mimetype
@@ -0,0 +1,117 @@
+import hashlib
+import hmac
+import time
+from collections import namedtuple
+from functools import wraps
+from flask import current_app, g, jsonify, redirect, session, url_for
+from controller.database import db
+from controller.model import User, Patient
+from controller.reference_data import get_doctor_ref_by_user
+
+# Who is making the request, worked out once before each request and kept
+# on g.current_user. Login stores the user's id, name, role and profile id
+# (their Doctor or Patient row) in the signed session cookie together with
+# a stamp of the role and password hash, so the common request needs no
+# identity query at all. The cookie is readable by the client, so the stamp
+# is an HMAC keyed with SECRET_KEY rather than a plain digest.
+#
+# Every IDENTITY_TTL seconds the user row is read again: if the stamp no
+# longer matches (password changed, role changed, account deleted) the
+# session is dropped. A doctor is also checked against the reference data
+# on every request, which costs no query, so blacklisting takes effect
+# straight away.
+
+IDENTITY_TTL = 60
+
+CurrentUser = namedtuple("CurrentUser", ["id", "username", "role", "profile_id"])
+
+
+def identity_stamp(role, password):
+    key = current_app.secret_key
+    if isinstance(key, str):
+        key = key.encode()
+    return hmac.new(key, f"{role}\0{password}".encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def profile_id_for(user_id, role):
+    if role == "doctor":
+        doctor = get_doctor_ref_by_user(user_id)
+        return doctor.id if doctor else None
+    if role == "patient":
+        return db.session.query(Patient.id).filter_by(user_id=user_id).scalar()
+    return None
+
+
+def remember_login(user):
+    """Store ``user``'s identity in the session (at login, or after the
+    user changed their own name or password)."""
+    session["user_id"] = user.id
+    session["username"] = user.username
+    session["role"] = user.role
+    session["profile_id"] = profile_id_for(user.id, user.role)
+    session["identity_stamp"] = identity_stamp(user.role, user.password)
+    session["identity_checked"] = time.time()
+
+
+def _revalidate(user_id):
+    row = db.session.query(User.username, User.role, User.password).filter(User.id == user_id).first()
+    if row is None or identity_stamp(row.role, row.password) != session.get("identity_stamp"):
+        return False
+    session["username"] = row.username
+    if session.get("profile_id") is None:
+        session["profile_id"] = profile_id_for(user_id, row.role)
+    session["identity_checked"] = time.time()
+    return True
+
+
+def load_identity():
+    g.current_user = None
+    user_id = session.get("user_id")
+    if user_id is None:
+        return
+
+    if "identity_stamp" not in session:
+        # Logged in before identities were kept in the session.
+        user = db.session.get(User, user_id)
+        if user is None:
+            session.clear()
+            return
+        remember_login(user)
+    elif time.time() - session.get("identity_checked", 0) > current_app.config.get("IDENTITY_TTL", IDENTITY_TTL):
+        if not _revalidate(user_id):
+            session.clear()
+            return
+
+    if session["role"] == "doctor":
+        doctor = get_doctor_ref_by_user(user_id)
+        if doctor is None or doctor.blacklisted:
+            session.clear()
+            return
+
+    g.current_user = CurrentUser(user_id, session["username"], session["role"], session.get("profile_id"))
+
+
+def current_user():
+    return g.get("current_user")
+
+
+def role_required(*roles, api=False):
+    """Let the view run only for a logged-in user with one of ``roles``
+    (any role if none are given). Others are sent to the login page, or
+    get a 401 JSON error with ``api``."""
+    def decorate(view):
+        @wraps(view)
+        def checked(*args, **kwargs):
+            user = current_user()
+            if user is None or (roles and user.role not in roles):
+                if api:
+                    who = f"{roles[0].capitalize()} login" if len(roles) == 1 else "Login"
+                    return jsonify(error=f"{who} required."), 401
+                return redirect(url_for("login"))
+            return view(*args, **kwargs)
+        return checked
+    return decorate
+
+
+def init_identity(app):
+    app.before_request(load_identity)
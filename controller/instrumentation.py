@@ -0,0 +1,225 @@
+import heapq
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from controller.database import all_engines
+
+
+@contextmanager
+def count_queries(app):
+    """Collect every SQL statement the app's engines run inside the block.
+
+    Yields the list the statements are appended to, so callers can check
+    ``len()`` afterwards or print them when a budget is exceeded.
+    """
+    with app.app_context():
+        engines = all_engines()
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def assert_query_count(client, url, max_queries, method="get", **kwargs):
+    """Request ``url`` through a Flask test client and fail if the route
+    issues more than ``max_queries`` statements.
+
+    Meant for catching N+1 regressions: seed a handful of rows, then pin
+    the budget for each list page, e.g.
+
+        assert_query_count(client, "/admin", 6)
+    """
+    with count_queries(client.application) as statements:
+        response = getattr(client, method)(url, **kwargs)
+
+    if len(statements) > max_queries:
+        listing = "\n".join(f"  {i}. {sql}" for i, sql in enumerate(statements, 1))
+        raise AssertionError(
+            f"{method.upper()} {url} ran {len(statements)} queries "
+            f"(budget {max_queries}):\n{listing}"
+        )
+    return response
+
+
+# Opt-in request profiling, switched on with PROFILE_REQUESTS. When it is
+# off, init_profiling() registers nothing, so requests pay no overhead.
+#
+# For each request the engine and template hooks below add up the number of
+# statements, time spent in the database and time spent rendering; the
+# totals are folded into per-endpoint metrics, served by /admin/metrics,
+# and written as one JSON log line per request.
+
+SLOW_QUERY_MS = 100
+SLOWEST_KEPT = 20
+
+
+class RequestProfile:
+    __slots__ = ("started", "queries", "db_seconds", "render_seconds", "render_started", "slowest")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.render_started = None
+        self.slowest = None
+
+
+class RequestMetrics:
+    """Per-endpoint totals and the slowest statements seen so far."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+        self.slow_queries = []
+
+    def record(self, endpoint, status, seconds, profile):
+        with self._lock:
+            stats = self.endpoints.setdefault(endpoint, {
+                "requests": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0,
+                "queries": 0, "db_seconds": 0.0, "render_seconds": 0.0,
+            })
+            stats["requests"] += 1
+            stats["errors"] += status >= 500
+            stats["seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            stats["queries"] += profile.queries
+            stats["db_seconds"] += profile.db_seconds
+            stats["render_seconds"] += profile.render_seconds
+
+    def record_slow_query(self, endpoint, statement, seconds):
+        with self._lock:
+            entry = (seconds, endpoint, " ".join(statement.split())[:500])
+            if len(self.slow_queries) < SLOWEST_KEPT:
+                heapq.heappush(self.slow_queries, entry)
+            elif seconds > self.slow_queries[0][0]:
+                heapq.heapreplace(self.slow_queries, entry)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "endpoints": {name: dict(stats) for name, stats in self.endpoints.items()},
+                "slow_queries": [
+                    {"ms": round(seconds * 1000, 2), "endpoint": endpoint, "statement": statement}
+                    for seconds, endpoint, statement in sorted(self.slow_queries, reverse=True)
+                ],
+            }
+
+    def prometheus(self):
+        """The endpoint totals in Prometheus text exposition format."""
+        series = (
+            ("hms_requests_total", "counter", "Requests handled.", "requests"),
+            ("hms_request_errors_total", "counter", "Requests answered with a 5xx status.", "errors"),
+            ("hms_request_seconds_total", "counter", "Wall time spent handling requests.", "seconds"),
+            ("hms_request_max_seconds", "gauge", "Slowest single request.", "max_seconds"),
+            ("hms_db_queries_total", "counter", "SQL statements executed.", "queries"),
+            ("hms_db_seconds_total", "counter", "Time spent executing SQL.", "db_seconds"),
+            ("hms_template_seconds_total", "counter", "Time spent rendering templates.", "render_seconds"),
+        )
+        endpoints = self.snapshot()["endpoints"]
+        lines = []
+        for name, kind, help_text, key in series:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for endpoint, stats in sorted(endpoints.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {stats[key]}')
+        return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics()
+
+
+def _current_profile():
+    if has_request_context():
+        return g.get("request_profile")
+    return None
+
+
+def init_profiling(app):
+    if not app.config.get("PROFILE_REQUESTS"):
+        return
+
+    slow_seconds = float(app.config.get("SLOW_QUERY_MS", SLOW_QUERY_MS)) / 1000
+    logger = logging.getLogger("hms.requests")
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+        logger.setLevel(logging.INFO)
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        profile = _current_profile()
+        if profile is None:
+            return
+        elapsed = time.perf_counter() - started
+        profile.queries += 1
+        profile.db_seconds += elapsed
+        if profile.slowest is None or elapsed > profile.slowest[0]:
+            profile.slowest = (elapsed, statement)
+        if elapsed >= slow_seconds:
+            request_metrics.record_slow_query(request.endpoint, statement, elapsed)
+
+    with app.app_context():
+        for engine in all_engines():
+            event.listen(engine, "before_cursor_execute", before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+    def template_started(sender, template, context, **extra):
+        profile = _current_profile()
+        if profile is not None:
+            profile.render_started = time.perf_counter()
+
+    def template_finished(sender, template, context, **extra):
+        profile = _current_profile()
+        if profile is not None and profile.render_started is not None:
+            profile.render_seconds += time.perf_counter() - profile.render_started
+            profile.render_started = None
+
+    before_render_template.connect(template_started, app, weak=False)
+    template_rendered.connect(template_finished, app, weak=False)
+
+    @app.before_request
+    def start_request_profile():
+        g.request_profile = RequestProfile()
+
+    @app.after_request
+    def finish_request_profile(response):
+        profile = g.pop("request_profile", None)
+        if profile is None:
+            return response
+
+        seconds = time.perf_counter() - profile.started
+        endpoint = request.endpoint or "unmatched"
+        request_metrics.record(endpoint, response.status_code, seconds, profile)
+        logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "endpoint": endpoint,
+            "status": response.status_code,
+            "ms": round(seconds * 1000, 2),
+            "queries": profile.queries,
+            "db_ms": round(profile.db_seconds * 1000, 2),
+            "render_ms": round(profile.render_seconds * 1000, 2),
+            "slowest_query_ms": round(profile.slowest[0] * 1000, 2) if profile.slowest else None,
+        }))
+        response.headers["Server-Timing"] = (
+            f"db;dur={profile.db_seconds * 1000:.2f}, "
+            f"render;dur={profile.render_seconds * 1000:.2f}, "
+            f"total;dur={seconds * 1000:.2f}"
+        )
+        return response
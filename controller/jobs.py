@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from controller.database import db
+from controller.model import Job
+
+# A small job queue kept in the application database, for work that should
+# not hold up a request: notifications, counter reconciliation, export
+# builds. Routes call enqueue() inside their own transaction, so a job
+# exists exactly when the change that asked for it was committed, and
+# `flask worker` runs the queued jobs in a separate process.
+#
+# A worker claims a job with one conditional UPDATE (queued -> running), so
+# any number of workers can share the queue. A failed job is retried with
+# exponential backoff until max_attempts; a job whose worker died is put
+# back once its lease of JOB_LEASE_SECONDS runs out.
+
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_SECONDS = 30
+JOB_LEASE_SECONDS = 600
+JOB_POLL_SECONDS = 1.0
+PENDING_STATUSES = ("queued", "running")
+
+HANDLERS = {}
+
+logger = logging.getLogger("hms.jobs")
+jobs_table = Job.__table__
+
+
+def job(kind):
+    """Register the decorated function as the handler for ``kind``."""
+    def register(handler):
+        HANDLERS[kind] = handler
+        return handler
+    return register
+
+
+def enqueue(kind, run_at=None, dedupe_key=None, max_attempts=JOB_MAX_ATTEMPTS, **payload):
+    """Queue a ``kind`` job that will be called with ``payload``.
+
+    Runs in the caller's transaction; the caller commits. ``run_at`` (UTC)
+    defers the job. While a job with the same ``dedupe_key`` is queued or
+    running nothing new is added. Returns the job id, or None if deduped.
+    """
+    now = datetime.utcnow()
+    statement = insert(jobs_table).values(
+        kind=kind,
+        payload=json.dumps(payload),
+        status="queued",
+        attempts=0,
+        max_attempts=max_attempts,
+        run_at=run_at or now,
+        dedupe_key=dedupe_key,
+        created_at=now
+    )
+    if dedupe_key is not None:
+        statement = statement.on_conflict_do_nothing()
+    return db.session.execute(statement.returning(jobs_table.c.id)).scalar()
+
+
+def claim_job(worker):
+    """Mark the next due job as running for ``worker`` and return it."""
+    now = datetime.utcnow()
+    next_id = (
+        select(jobs_table.c.id)
+        .where(jobs_table.c.status == "queued", jobs_table.c.run_at <= now)
+        .order_by(jobs_table.c.run_at, jobs_table.c.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    row = db.session.execute(
+        update(jobs_table)
+        .where(jobs_table.c.id == next_id, jobs_table.c.status == "queued")
+        .values(status="running", locked_by=worker, locked_at=now,
+                attempts=jobs_table.c.attempts + 1)
+        .returning(jobs_table)
+    ).first()
+    db.session.commit()
+    return row
+
+
+def requeue_expired():
+    """Put back running jobs whose lease ran out (their worker died)."""
+    expired = datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)
+    running = (jobs_table.c.status == "running", jobs_table.c.locked_at < expired)
+    db.session.execute(
+        update(jobs_table)
+        .where(*running, jobs_table.c.attempts >= jobs_table.c.max_attempts)
+        .values(status="failed", last_error="lease expired", finished_at=datetime.utcnow())
+    )
+    requeued = db.session.execute(
+        update(jobs_table).where(*running)
+        .values(status="queued", locked_by=None, locked_at=None)
+    ).rowcount
+    db.session.commit()
+    return requeued
+
+
+def _finish(row, worker, **values):
+    db.session.execute(
+        update(jobs_table)
+        .where(jobs_table.c.id == row.id, jobs_table.c.locked_by == worker)
+        .values(locked_by=None, locked_at=None, **values)
+    )
+    db.session.commit()
+
+
+def run_job(row, worker):
+    """Run a claimed job and record the outcome; True if it succeeded."""
+    handler = HANDLERS.get(row.kind)
+    started = time.perf_counter()
+    try:
+        if handler is None:
+            raise LookupError(f"no handler for job kind {row.kind!r}")
+        result = handler(**json.loads(row.payload))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc(limit=5)
+        if handler is not None and row.attempts < row.max_attempts:
+            delay = JOB_RETRY_SECONDS * 2 ** (row.attempts - 1)
+            _finish(row, worker, status="queued", last_error=error,
+                    run_at=datetime.utcnow() + timedelta(seconds=delay))
+            logger.warning("job %s (%s) failed, retry %d in %ds",
+                           row.id, row.kind, row.attempts, delay)
+        else:
+            _finish(row, worker, status="failed", last_error=error, finished_at=datetime.utcnow())
+            logger.error("job %s (%s) failed for good:\n%s", row.id, row.kind, error)
+        return False
+
+    _finish(row, worker, status="done", finished_at=datetime.utcnow(),
+            result=None if result is None else json.dumps(result, default=str))
+    logger.info("job %s (%s) done in %.1f ms", row.id, row.kind,
+                (time.perf_counter() - started) * 1000)
+    return True
+
+
+def work(worker=None, burst=False, poll=JOB_POLL_SECONDS, max_jobs=None):
+    """Run jobs until stopped. With ``burst``, return once the queue has
+    nothing due. Returns the number of jobs run."""
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    ran = 0
+    swept = 0.0
+    while max_jobs is None or ran < max_jobs:
+        if time.monotonic() - swept > JOB_LEASE_SECONDS / 10:
+            requeue_expired()
+            swept = time.monotonic()
+        row = claim_job(worker)
+        if row is None:
+            if burst:
+                break
+            time.sleep(poll)
+            continue
+        run_job(row, worker)
+        ran += 1
+    return ran
+
+
+def job_counts():
+    rows = db.session.query(Job.status, func.count()).group_by(Job.status)
+    return dict(rows)
+
+
+def job_status(job_id):
+    row = db.session.get(Job, job_id)
+    if row is None:
+        return None
+    return {
+        "id": row.id,
+        "kind": row.kind,
+        "status": row.status,
+        "attempts": row.attempts,
+        "run_at": row.run_at.isoformat(),
+        "finished_at": row.finished_at.isoformat() if row.finished_at else None,
+        "result": json.loads(row.result) if row.result else None,
+        "last_error": row.last_error if row.status != "done" else None,
+    }
+
+
+def prune_jobs(older_than):
+    """Delete finished jobs (done or failed) from before ``older_than``."""
+    result = db.session.execute(
+        delete(jobs_table).where(
+            jobs_table.c.status.notin_(PENDING_STATUSES),
+            jobs_table.c.finished_at < older_than
+        )
+    )
+    db.session.commit()
+    return result.rowcount
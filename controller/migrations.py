@@ -0,0 +1,138 @@
+from sqlalchemy import inspect, text
+from controller.database import db
+from controller.search import create_search_index
+from controller.slot_calendar import rebuild_calendar
+
+# db.create_all() only creates tables that are missing; it never touches an
+# existing table. Anything added to a table after a database file was first
+# created (indexes, columns, backfills) has to be applied here instead.
+#
+# Steps run in order and the last one applied is recorded in SQLite's
+# PRAGMA user_version, so each runs once per database file. Each step runs
+# in its own explicit transaction together with its user_version bump
+# (pysqlite would otherwise autocommit DDL such as ALTER TABLE), so a step
+# that fails leaves nothing behind and is simply tried again on the next
+# start. Every step must also be safe to run against a fresh database that
+# create_all() has just built with the current models.
+
+
+def table_columns(connection, table_name):
+    return {column["name"] for column in inspect(connection).get_columns(table_name)}
+
+
+# Unique indexes that existing rows may violate. They are left to the step
+# that cleans those rows up first.
+DEFERRED_INDEXES = {"uq_appointments_active_slot"}
+
+
+def create_model_indexes(connection, deferred=DEFERRED_INDEXES):
+    # Indexes over columns a later step has yet to add are skipped here;
+    # that step creates them once the column exists.
+    for table in db.metadata.sorted_tables:
+        existing = table_columns(connection, table.name)
+        for index in table.indexes:
+            if index.name in deferred:
+                continue
+            if {column.name for column in index.columns} <= existing:
+                index.create(bind=connection, checkfirst=True)
+
+
+# SQLAlchemy stores DateTime on SQLite as "YYYY-MM-DD HH:MM:SS.ffffff";
+# backfilled values must match that text exactly for equality lookups.
+SLOT_START_SQL = """
+    UPDATE {table}
+    SET date = date(date),
+        slot_start = date(date) || ' ' || substr(trim({label}), 1, 5) || ':00.000000'
+    WHERE slot_start IS NULL
+      AND date(date) IS NOT NULL
+      AND trim({label}) GLOB '[0-2][0-9]:[0-5][0-9]*'
+"""
+
+
+def add_slot_start_columns(connection):
+    for table, label in (("appointments", "time"), ("doctor_availability", "time_slot")):
+        if "slot_start" not in table_columns(connection, table):
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN slot_start DATETIME"))
+        connection.exec_driver_sql(SLOT_START_SQL.format(table=table, label=label))
+
+    connection.execute(text("DROP INDEX IF EXISTS ix_appointments_doctor_slot"))
+    connection.execute(text("DROP INDEX IF EXISTS ix_doctor_availability_doctor_available"))
+    create_model_indexes(connection)
+
+
+def enforce_single_active_booking(connection):
+    # Older databases may already hold double bookings. Keep the earliest
+    # booking for each doctor and slot, cancel the rest, then add the
+    # unique index that stops it happening again.
+    cancelled = connection.exec_driver_sql("""
+        UPDATE appointments SET status = 'Cancelled'
+        WHERE status IN ('Booked', 'Pending')
+          AND slot_start IS NOT NULL
+          AND id NOT IN (
+              SELECT min(id) FROM appointments
+              WHERE status IN ('Booked', 'Pending') AND slot_start IS NOT NULL
+              GROUP BY doctor_id, slot_start
+          )
+    """).rowcount
+    if cancelled:
+        print(f"Cancelled {cancelled} double-booked appointments")
+
+    connection.exec_driver_sql("""
+        UPDATE doctor_availability SET is_available = 0
+        WHERE EXISTS (
+            SELECT 1 FROM appointments
+            WHERE appointments.doctor_id = doctor_availability.doctor_id
+              AND appointments.slot_start = doctor_availability.slot_start
+              AND appointments.status IN ('Booked', 'Pending')
+        )
+    """)
+    create_model_indexes(connection, deferred=())
+
+
+def add_availability_version(connection):
+    if "availability_version" not in table_columns(connection, "doctors"):
+        connection.exec_driver_sql(
+            "ALTER TABLE doctors ADD COLUMN availability_version INTEGER NOT NULL DEFAULT 0"
+        )
+
+
+def index_username_only(connection):
+    # Logins look users up by name and check the password hash afterwards,
+    # so the password no longer belongs in the index.
+    connection.execute(text("DROP INDEX IF EXISTS ix_users_username_password"))
+    create_model_indexes(connection)
+
+
+def index_active_slot_order(connection):
+    # The admin appointment list seeks on (slot_start, id) over the active
+    # statuses; create_model_indexes adds ix_appointments_active_slot_start.
+    create_model_indexes(connection)
+
+
+MIGRATIONS = [
+    create_model_indexes,
+    add_slot_start_columns,
+    create_search_index,
+    enforce_single_active_booking,
+    add_availability_version,
+    rebuild_calendar,
+    index_username_only,
+    index_active_slot_order,
+]
+
+
+def schema_version(connection):
+    return connection.execute(text("PRAGMA user_version")).scalar()
+
+
+def run_migrations():
+    with db.engine.connect() as connection:
+        version = schema_version(connection)
+    for number, step in enumerate(MIGRATIONS, start=1):
+        if number <= version:
+            continue
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            step(connection)
+            connection.execute(text(f"PRAGMA user_version = {number}"))
+        print(f"Applied migration {number}: {step.__name__}")
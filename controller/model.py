@@ -3,6 +3,10 @@ from datetime import datetime
 
 class User(db.Model):
     __tablename__ = "users"
+    __table_args__ = (
+        db.Index("ix_users_username", "username"),
+        db.Index("ix_users_role", "role"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -72,6 +76,9 @@ class Patient(db.Model):
 
 class Doctor(db.Model):
     __tablename__ = "doctors"
+    __table_args__ = (
+        db.Index("ix_doctors_department_blacklisted", "department_id", "blacklisted"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -85,6 +92,7 @@ class Doctor(db.Model):
     department_id = db.Column(db.Integer, db.ForeignKey("departments.id"), nullable=True)
     specialization = db.Column(db.String(120))
     blacklisted = db.Column(db.Boolean, default=False)
+    availability_version = db.Column(db.Integer, nullable=False, default=0)
     user = db.relationship("User", back_populates="doctor_profile")
     department = db.relationship("Department", back_populates="doctors")
 
@@ -98,6 +106,22 @@ class Doctor(db.Model):
 
 class Appointment(db.Model):
     __tablename__ = "appointments"
+    __table_args__ = (
+        db.Index("ix_appointments_doctor_slot_start", "doctor_id", "slot_start", "status"),
+        db.Index("ix_appointments_patient_status", "patient_id", "status"),
+        db.Index(
+            "uq_appointments_active_slot", "doctor_id", "slot_start",
+            unique=True,
+            sqlite_where=db.text("status IN ('Booked', 'Pending')")
+        ),
+        # The admin dashboard's appointment list, in slot order. SQLite only
+        # picks a partial index when the query spells out the same literal
+        # statuses (see get_future_appointments).
+        db.Index(
+            "ix_appointments_active_slot_start", "slot_start", "id",
+            sqlite_where=db.text("status IN ('Booked', 'Completed')")
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -113,8 +137,9 @@ class Appointment(db.Model):
         nullable=True
     )
 
-    date = db.Column(db.String(50))
+    date = db.Column(db.Date)
     time = db.Column(db.String(50))
+    slot_start = db.Column(db.DateTime)
 
     status = db.Column(db.String(50), default="Pending")
 
@@ -125,18 +150,25 @@ class Appointment(db.Model):
 
 class Doctor_availability(db.Model):
     __tablename__ = "doctor_availability"
+    __table_args__ = (
+        db.Index("ix_doctor_availability_doctor_slot_start", "doctor_id", "is_available", "slot_start"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     doctor_id = db.Column(db.Integer, db.ForeignKey("doctors.id"), nullable=False)
 
-    date = db.Column(db.String(50), nullable=False)
+    date = db.Column(db.Date, nullable=False)
     time_slot = db.Column(db.String(50), nullable=False)
+    slot_start = db.Column(db.DateTime)
     is_available = db.Column(db.Boolean, default=False)
 
-    doctor = db.relationship("Doctor", backref="availability")
+    doctor = db.relationship("Doctor", backref=db.backref("availability", cascade="all, delete-orphan"))
 
 class PatientHistory(db.Model):
     __tablename__ = "patient_history"
+    __table_args__ = (
+        db.Index("ix_patient_history_patient_date", "patient_id", "date"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey("patients.id"), nullable=False)
@@ -146,4 +178,67 @@ class PatientHistory(db.Model):
     date = db.Column(db.DateTime, default=datetime.utcnow())
 
     patient = db.relationship("Patient", back_populates="history_records")
+    author = db.relationship("User", foreign_keys=[created_by])
+
+
+class DoctorCalendar(db.Model):
+    __tablename__ = "doctor_calendar"
+    __table_args__ = (
+        db.Index("ix_doctor_calendar_day_doctor", "day", "doctor_id"),
+    )
+
+    doctor_id = db.Column(db.Integer, db.ForeignKey("doctors.id", ondelete="CASCADE"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    open_mask = db.Column(db.LargeBinary, nullable=False)
+
 
+class DashboardCounter(db.Model):
+    __tablename__ = "dashboard_counters"
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    reconciled_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class AppointmentEvent(db.Model):
+    __tablename__ = "appointment_events"
+    __table_args__ = (
+        db.Index("ix_appointment_events_doctor_id", "doctor_id", "id"),
+        db.Index("ix_appointment_events_patient_id", "patient_id", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    appointment_id = db.Column(db.Integer)
+    doctor_id = db.Column(db.Integer)
+    patient_id = db.Column(db.Integer)
+    slot_start = db.Column(db.DateTime)
+    status = db.Column(db.String(50))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class Job(db.Model):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        db.Index("ix_jobs_status_run_at", "status", "run_at"),
+        db.Index(
+            "uq_jobs_pending_key", "dedupe_key",
+            unique=True,
+            sqlite_where=db.text("status IN ('queued', 'running')")
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default="{}")
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    dedupe_key = db.Column(db.String(100))
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    result = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
@@ -0,0 +1,186 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import update
+from controller.database import db
+from controller.model import User
+
+# Password storage. New passwords are stored as
+# "<method>$<cost>$<salt>$<digest>" (scrypt or pbkdf2_sha256 from hashlib),
+# so every row says how to check it and rows made under an older setting
+# keep working. Rows from before hashing hold the plain password; they are
+# accepted once more and rewritten with the current method and cost on a
+# successful login (or all at once with `flask hash-passwords`).
+#
+# Hashing is deliberately slow, so routes don't do it on the request
+# thread: check_password() and make_password_hash() run it on a small
+# thread pool (hashlib releases the GIL while it works). At most
+# workers + queue checks are in flight; a request that can't get a place
+# within PASSWORD_VERIFY_WAIT seconds gets PasswordCheckBusy, so a burst of
+# logins is turned away instead of holding every server thread.
+
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = 600000
+DEFAULT_COSTS = {"scrypt": SCRYPT_N, "pbkdf2_sha256": PBKDF2_ITERATIONS}
+SALT_BYTES = 16
+
+VERIFY_WORKERS = 4
+VERIFY_QUEUE = 16
+VERIFY_WAIT = 2.0
+
+Policy = namedtuple("Policy", ["method", "cost"])
+
+policy = Policy("scrypt", SCRYPT_N)
+_executor = None
+_slots = threading.BoundedSemaphore(VERIFY_WORKERS + VERIFY_QUEUE)
+_wait = VERIFY_WAIT
+_dummy = {}
+
+
+class PasswordCheckBusy(Exception):
+    pass
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _derive(method, cost, salt, password):
+    secret = (password or "").encode()
+    if method == "scrypt":
+        return hashlib.scrypt(secret, salt=salt, n=cost, r=SCRYPT_R, p=SCRYPT_P,
+                              maxmem=256 * SCRYPT_R * cost, dklen=32)
+    if method == "pbkdf2_sha256":
+        return hashlib.pbkdf2_hmac("sha256", secret, salt, cost)
+    raise ValueError(f"unknown password hash method {method!r}")
+
+
+def parse_hash(stored):
+    """(method, cost, salt, digest), or None for a legacy plain password."""
+    parts = (stored or "").split("$")
+    if len(parts) != 4 or parts[0] not in DEFAULT_COSTS or not parts[1].isdigit():
+        return None
+    method, cost, salt, digest = parts
+    return method, int(cost), _unb64(salt), _unb64(digest)
+
+
+def hash_password(password, method=None, cost=None):
+    method = method or policy.method
+    cost = cost or (policy.cost if method == policy.method else DEFAULT_COSTS[method])
+    salt = os.urandom(SALT_BYTES)
+    return f"{method}${cost}${_b64(salt)}${_b64(_derive(method, cost, salt, password))}"
+
+
+def verify_password(stored, password):
+    parsed = parse_hash(stored)
+    if parsed is None:
+        return stored is not None and hmac.compare_digest(stored.encode(), (password or "").encode())
+    method, cost, salt, digest = parsed
+    return hmac.compare_digest(_derive(method, cost, salt, password), digest)
+
+
+def needs_rehash(stored):
+    parsed = parse_hash(stored)
+    return parsed is None or (parsed[0], parsed[1]) != tuple(policy)
+
+
+def _dummy_hash():
+    # Checked against when the username doesn't exist, so an unknown user
+    # takes as long to reject as a wrong password.
+    if policy not in _dummy:
+        _dummy[policy] = hash_password(os.urandom(SALT_BYTES).hex())
+    return _dummy[policy]
+
+
+def _check(stored, password):
+    if stored is None:
+        verify_password(_dummy_hash(), password)
+        return False, None
+    if not verify_password(stored, password):
+        return False, None
+    return True, hash_password(password) if needs_rehash(stored) else None
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(VERIFY_WORKERS, thread_name_prefix="password")
+    return _executor
+
+
+def _bounded(function, *args):
+    if not _slots.acquire(timeout=_wait):
+        raise PasswordCheckBusy("Too many password checks in progress.")
+    try:
+        return _pool().submit(function, *args).result()
+    finally:
+        _slots.release()
+
+
+def check_password(stored, password):
+    """Check ``password`` against ``stored`` (None for an unknown user) on
+    the pool. Returns (ok, new_hash); new_hash is set when the row should be
+    rewritten under the current policy. Raises PasswordCheckBusy."""
+    return _bounded(_check, stored, password)
+
+
+def make_password_hash(password):
+    """hash_password() on the pool. Raises PasswordCheckBusy."""
+    return _bounded(hash_password, password)
+
+
+def hash_passwords(passwords, cost=None):
+    """Hash many passwords at once, for imports and backfills. ``cost``
+    overrides the policy cost; such rows are rehashed at the next login."""
+    return list(_pool().map(lambda password: hash_password(password, cost=cost), passwords))
+
+
+def hash_legacy_passwords(chunk_size=1000):
+    """Replace every remaining plain password with a hash; returns the count."""
+    last_id, hashed = 0, 0
+    while True:
+        rows = (
+            db.session.query(User.id, User.password)
+            .filter(User.id > last_id)
+            .order_by(User.id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not rows:
+            return hashed
+        last_id = rows[-1].id
+        legacy = [(user_id, password) for user_id, password in rows if parse_hash(password) is None]
+        if legacy:
+            hashes = hash_passwords([password for _, password in legacy])
+            db.session.execute(update(User), [
+                dict(id=user_id, password=new_hash)
+                for (user_id, _), new_hash in zip(legacy, hashes)
+            ])
+            db.session.commit()
+            hashed += len(legacy)
+
+
+def configure_passwords(app):
+    global policy, _executor, _slots, _wait
+    method = app.config.get("PASSWORD_HASH_METHOD") or policy.method
+    if method not in DEFAULT_COSTS:
+        raise ValueError(f"PASSWORD_HASH_METHOD must be one of {sorted(DEFAULT_COSTS)}")
+    policy = Policy(method, int(app.config.get("PASSWORD_HASH_COST") or DEFAULT_COSTS[method]))
+
+    workers = int(app.config.get("PASSWORD_VERIFY_WORKERS", VERIFY_WORKERS))
+    queue = int(app.config.get("PASSWORD_VERIFY_QUEUE", VERIFY_QUEUE))
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _executor = ThreadPoolExecutor(workers, thread_name_prefix="password")
+    _slots = threading.BoundedSemaphore(workers + queue)
+    _wait = float(app.config.get("PASSWORD_VERIFY_WAIT", VERIFY_WAIT))
@@ -0,0 +1,130 @@
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from controller.cache import versions_of
+from controller.database import db
+from controller.model import User, Department, Doctor
+
+# Process-local copy of the small, rarely changing tables that nearly every
+# route looks things up in: departments, and each doctor's name, department
+# and blacklist flag. It is loaded once at startup and reloaded whenever the
+# "departments" or "doctors" data version moves (see controller.cache), so
+# the hot lookups below cost a dict access instead of a query.
+#
+# Other worker processes don't see this process's version bumps, so a copy
+# is also reloaded after REFERENCE_TTL seconds, and a doctor lookup that
+# misses reloads once before giving up (a doctor created elsewhere). Misses
+# come straight from URLs, so that reload only happens when the copy is more
+# than REFERENCE_MISS_RELOAD seconds old; a stream of unknown ids costs at
+# most one reload per interval.
+
+REFERENCE_TTL = 60
+REFERENCE_MISS_RELOAD = 5
+REFERENCE_VERSIONS = ("departments", "doctors")
+
+DepartmentRef = namedtuple("DepartmentRef", ["id", "name", "description"])
+DoctorRef = namedtuple(
+    "DoctorRef",
+    ["id", "user_id", "name", "department_id", "department", "specialization", "blacklisted"]
+)
+
+Snapshot = namedtuple(
+    "Snapshot",
+    ["versions", "loaded_at", "departments", "doctors", "doctors_by_user", "etag"]
+)
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def load_reference_data():
+    """Read departments and the doctor roster into a fresh snapshot."""
+    global _snapshot
+    versions = versions_of(REFERENCE_VERSIONS)
+
+    departments = {
+        row.id: DepartmentRef(*row)
+        for row in db.session.query(Department.id, Department.name, Department.description)
+        .order_by(Department.id)
+    }
+    doctors = {}
+    rows = (
+        db.session.query(
+            Doctor.id, Doctor.user_id, User.username, Doctor.department_id,
+            Doctor.specialization, Doctor.blacklisted
+        )
+        .join(User, User.id == Doctor.user_id)
+        .order_by(Doctor.id)
+    )
+    for id, user_id, name, department_id, specialization, blacklisted in rows:
+        department = departments.get(department_id)
+        doctors[id] = DoctorRef(
+            id, user_id, name, department_id,
+            department.name if department else None,
+            specialization, bool(blacklisted)
+        )
+
+    # Changes whenever the content does, so API responses built only from
+    # the snapshot can be revalidated without a query.
+    etag = hashlib.sha1(repr((departments, doctors)).encode()).hexdigest()[:16]
+
+    _snapshot = Snapshot(
+        versions, time.monotonic(), departments, doctors,
+        {doctor.user_id: doctor for doctor in doctors.values()}, etag
+    )
+    return _snapshot
+
+
+def reference_data(force=False):
+    snapshot = _snapshot
+    if (
+        force
+        or snapshot is None
+        or snapshot.versions != versions_of(REFERENCE_VERSIONS)
+        or time.monotonic() - snapshot.loaded_at > REFERENCE_TTL
+    ):
+        with _lock:
+            if snapshot is _snapshot:
+                return load_reference_data()
+            return _snapshot
+    return snapshot
+
+
+def reference_etag():
+    return reference_data().etag
+
+
+def all_departments():
+    return list(reference_data().departments.values())
+
+
+def get_department_ref(department_id):
+    try:
+        return reference_data().departments.get(int(department_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def _doctor_lookup(table, key):
+    snapshot = reference_data()
+    found = getattr(snapshot, table).get(key)
+    if found is None and key is not None and time.monotonic() - snapshot.loaded_at > REFERENCE_MISS_RELOAD:
+        found = getattr(reference_data(force=True), table).get(key)
+    return found
+
+
+def get_doctor_ref(doctor_id):
+    return _doctor_lookup("doctors", doctor_id)
+
+
+def get_doctor_ref_by_user(user_id):
+    return _doctor_lookup("doctors_by_user", user_id)
+
+
+def department_roster(department_id):
+    """Bookable (not blacklisted) doctors of a department, by id."""
+    return [
+        doctor for doctor in reference_data().doctors.values()
+        if doctor.department_id == department_id and not doctor.blacklisted
+    ]
@@ -0,0 +1,105 @@
+import re
+from sqlalchemy import column, literal_column, select, table
+
+# Full-text index behind the admin user search. It is an FTS5 virtual table
+# keyed by users.id (its rowid), so it lives outside db.metadata and is
+# created by a migration step rather than db.create_all(). Triggers on the
+# source tables keep it in step with every insert, update and delete.
+SEARCH_TABLE = "user_search"
+
+search_index = table(SEARCH_TABLE, column("rowid"))
+
+CREATE_SEARCH_TABLE = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        username, email, specialization, department,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+"""
+
+SEARCH_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS user_search_user_insert AFTER INSERT ON users BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, username, email, specialization, department)
+        VALUES (new.id, new.username, new.email, '', '');
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS user_search_user_update AFTER UPDATE OF username, email ON users BEGIN
+        UPDATE {SEARCH_TABLE} SET username = new.username, email = new.email
+        WHERE rowid = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS user_search_user_delete AFTER DELETE ON users BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS user_search_doctor_insert AFTER INSERT ON doctors BEGIN
+        UPDATE {SEARCH_TABLE}
+        SET specialization = coalesce(new.specialization, ''),
+            department = coalesce((SELECT name FROM departments WHERE id = new.department_id), '')
+        WHERE rowid = new.user_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS user_search_doctor_update
+    AFTER UPDATE OF specialization, department_id ON doctors BEGIN
+        UPDATE {SEARCH_TABLE}
+        SET specialization = coalesce(new.specialization, ''),
+            department = coalesce((SELECT name FROM departments WHERE id = new.department_id), '')
+        WHERE rowid = new.user_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS user_search_doctor_delete AFTER DELETE ON doctors BEGIN
+        UPDATE {SEARCH_TABLE} SET specialization = '', department = ''
+        WHERE rowid = old.user_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS user_search_department_update AFTER UPDATE OF name ON departments BEGIN
+        UPDATE {SEARCH_TABLE} SET department = new.name
+        WHERE rowid IN (SELECT user_id FROM doctors WHERE department_id = new.id);
+    END
+    """,
+]
+
+REBUILD_SEARCH_INDEX = f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, username, email, specialization, department)
+    SELECT users.id, users.username, users.email,
+           coalesce(doctors.specialization, ''), coalesce(departments.name, '')
+    FROM users
+    LEFT JOIN doctors ON doctors.user_id = users.id
+    LEFT JOIN departments ON departments.id = doctors.department_id
+"""
+
+
+def create_search_index(connection):
+    connection.exec_driver_sql(CREATE_SEARCH_TABLE)
+    for trigger in SEARCH_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+    connection.exec_driver_sql(f"DELETE FROM {SEARCH_TABLE}")
+    connection.exec_driver_sql(REBUILD_SEARCH_INDEX)
+
+
+def fts_query(search_input):
+    """Turn free text from the search box into an FTS5 query where every
+    word must match as a prefix, e.g. "jo card" -> '"jo"* "card"*'.
+
+    Returns None when there is nothing searchable in the input.
+    """
+    terms = re.findall(r"\w+", search_input or "")
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def matching_user_ids(search_input):
+    query = fts_query(search_input)
+    if query is None:
+        return None
+    return select(search_index.c.rowid).where(
+        literal_column(SEARCH_TABLE).op("MATCH")(query)
+    )
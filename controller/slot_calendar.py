@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from controller.database import db
+from controller.model import Doctor, DoctorCalendar, Doctor_availability
+from controller.slots import SLOT_MAP, slot_bounds
+
+# Compact view of when each doctor is free. A doctor's day is one bitmask
+# with a bit per SLOT_MINUTES of the day (96 bits at 15 minutes), set where
+# the doctor has an open, unbooked availability row. "Is X free for this
+# slot" is then a single AND against the slot's span, however fine the
+# granularity gets.
+#
+# doctor_calendar is derived data: refresh_day() rebuilds one doctor-day
+# from doctor_availability, and is called in the same transaction as every
+# change to it.
+
+SLOT_MINUTES = 15
+BITS_PER_DAY = 24 * 60 // SLOT_MINUTES
+MASK_BYTES = (BITS_PER_DAY + 7) // 8
+
+
+def span_mask(start_minute, end_minute):
+    first = start_minute // SLOT_MINUTES
+    last = -(-end_minute // SLOT_MINUTES)
+    return ((1 << (last - first)) - 1) << first
+
+
+def label_mask(label):
+    bounds = slot_bounds(label)
+    return span_mask(*bounds) if bounds else 0
+
+
+def pack(mask):
+    return mask.to_bytes(MASK_BYTES, "little")
+
+
+def unpack(raw):
+    return int.from_bytes(raw or b"", "little")
+
+
+def day_mask(doctor_id, day):
+    start = datetime.combine(day, datetime.min.time())
+    labels = db.session.query(Doctor_availability.time_slot).filter(
+        Doctor_availability.doctor_id == doctor_id,
+        Doctor_availability.is_available == True,
+        Doctor_availability.slot_start >= start,
+        Doctor_availability.slot_start < start + timedelta(days=1)
+    )
+    mask = 0
+    for label, in labels:
+        mask |= label_mask(label)
+    return mask
+
+
+def refresh_day(doctor_id, day):
+    mask = pack(day_mask(doctor_id, day))
+    db.session.execute(
+        sqlite_insert(DoctorCalendar)
+        .values(doctor_id=doctor_id, day=day, open_mask=mask)
+        .on_conflict_do_update(
+            index_elements=["doctor_id", "day"],
+            set_={"open_mask": mask}
+        )
+    )
+
+
+def rebuild_calendar(connection):
+    """Recompute every doctor-day from doctor_availability in one pass."""
+    masks = {}
+    rows = connection.execute(
+        db.select(
+            Doctor_availability.doctor_id,
+            Doctor_availability.slot_start,
+            Doctor_availability.time_slot
+        ).where(
+            Doctor_availability.is_available == True,
+            Doctor_availability.slot_start.isnot(None)
+        )
+    )
+    for doctor_id, start, label in rows:
+        key = (doctor_id, start.date())
+        masks[key] = masks.get(key, 0) | label_mask(label)
+
+    connection.execute(db.delete(DoctorCalendar))
+    if masks:
+        connection.execute(db.insert(DoctorCalendar), [
+            dict(doctor_id=doctor_id, day=day, open_mask=pack(mask))
+            for (doctor_id, day), mask in masks.items()
+        ])
+
+
+def free_slots(doctor_id, start_day, days=7):
+    """Bookable (day, label) pairs for a doctor over ``days`` days from
+    ``start_day``, read from one range scan of the doctor's calendar rows."""
+    rows = DoctorCalendar.query.filter(
+        DoctorCalendar.doctor_id == doctor_id,
+        DoctorCalendar.day >= start_day,
+        DoctorCalendar.day < start_day + timedelta(days=days)
+    ).order_by(DoctorCalendar.day)
+
+    free = []
+    for row in rows:
+        mask = unpack(row.open_mask)
+        for label in SLOT_MAP.values():
+            wanted = label_mask(label)
+            if wanted and mask & wanted == wanted:
+                free.append((row.day, label))
+    return free
+
+
+def doctors_free_at(department_id, day, label):
+    """Ids of the department's non-blacklisted doctors who are free for the
+    whole of ``label`` on ``day``."""
+    wanted = label_mask(label)
+    if not wanted:
+        return []
+
+    rows = (
+        db.session.query(DoctorCalendar.doctor_id, DoctorCalendar.open_mask)
+        .join(Doctor, Doctor.id == DoctorCalendar.doctor_id)
+        .filter(
+            DoctorCalendar.day == day,
+            Doctor.department_id == department_id,
+            Doctor.blacklisted == False
+        )
+    )
+    return [doctor_id for doctor_id, raw in rows if unpack(raw) & wanted == wanted]
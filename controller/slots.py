@@ -0,0 +1,50 @@
+from datetime import date, datetime, time
+
+# Bookable slots on the availability grid, keyed by the column number the
+# form posts. The label is what patients and doctors see; the start time
+# parsed from it is what gets stored and queried.
+SLOT_MAP = {
+    "1": "08:00 - 12:00",
+    "2": "12:00 - 16:00",
+    "3": "16:00 - 20:00",
+    "4": "20:00 - 00:00"
+}
+
+
+def parse_date(value):
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def slot_bounds(label):
+    """(start, end) of the slot ``label`` in minutes after midnight, with a
+    slot ending at "00:00" running to 1440. None if it can't be parsed."""
+    try:
+        start, end = label.split("-", 1)
+        bounds = []
+        for part in (start, end):
+            hours, minutes = part.strip().split(":")
+            bounds.append(int(hours) * 60 + int(minutes))
+    except (AttributeError, ValueError):
+        return None
+    start, end = bounds
+    if end <= start:
+        end += 24 * 60
+    return start, min(end, 24 * 60)
+
+
+def slot_start(day, label):
+    """Datetime at which the slot ``label`` (e.g. "08:00 - 12:00") begins
+    on ``day``, or None if either part can't be parsed."""
+    day = parse_date(day)
+    if day is None or not label:
+        return None
+    try:
+        hours, minutes = label.split("-", 1)[0].strip().split(":")
+        return datetime.combine(day, time(int(hours), int(minutes)))
+    except ValueError:
+        return None
@@ -1,16 +1,98 @@
-from controller.database import db
-from controller.model import User, Doctor, Appointment, Department, Patient, Doctor_availability, PatientHistory
-from datetime import datetime
+from controller.cache import invalidate_model
+from controller.database import db, read_session
+from controller.model import User, Doctor, Appointment, Department, Patient, Doctor_availability, PatientHistory, DashboardCounter
+from controller.search import matching_user_ids
+from sqlalchemy import and_, bindparam, or_, tuple_
+from sqlalchemy.orm import joinedload, selectinload
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date, datetime
+import base64
+import json
 
 sess = db.session
 
+PAGE_SIZE = 20
+BULK_CHUNK_SIZE = 1000
+MAX_PAGE_SIZE = 100
+
+ACTIVE_APPOINTMENT_STATUSES = ("Booked", "Completed")
+
+Page = namedtuple("Page", ["items", "next_cursor", "prev_cursor"])
+
+# Loader options for the relationships the templates walk, so a list page
+# costs a fixed number of queries instead of one lazy load per row.
+# Many-to-one hops are joined into the main query; collections are
+# fetched with one extra SELECT ... IN per relationship.
+LOAD_DOCTOR_PROFILE = (joinedload(Doctor.user), joinedload(Doctor.department))
+LOAD_USER_PROFILES = (
+    selectinload(User.doctor_profile).joinedload(Doctor.department),
+    selectinload(User.patient_profile),
+)
+LOAD_PATIENT_USER = (joinedload(Patient.user),)
+LOAD_HISTORY_AUTHOR = (joinedload(PatientHistory.author),)
+
+@contextmanager
+def unit_of_work():
+    """Group every write in the block into one transaction.
+
+    add_record() and delete_record() only flush inside the block (so new
+    rows get their ids straight away) and the whole lot is committed once
+    on the way out, or rolled back if the block raises. Nested blocks join
+    the outermost one.
+
+        with unit_of_work():
+            add_record(user)
+            add_record(Patient(user_id=user.id))
+    """
+    if sess.info.get("unit_of_work"):
+        yield sess
+        return
+
+    sess.info["unit_of_work"] = True
+    try:
+        yield sess
+        sess.commit()
+    except Exception:
+        sess.rollback()
+        raise
+    finally:
+        sess.info.pop("unit_of_work", None)
+
+def in_unit_of_work():
+    return bool(sess.info.get("unit_of_work"))
+
 def add_record(record):
     sess.add(record)
-    sess.commit()
+    if in_unit_of_work():
+        sess.flush()
+    else:
+        sess.commit()
 
 def delete_record(record):
     sess.delete(record)
-    sess.commit()
+    if in_unit_of_work():
+        sess.flush()
+    else:
+        sess.commit()
+
+def bulk_insert(model, rows, chunk_size=BULK_CHUNK_SIZE):
+    """Insert ``rows`` (a list of column dicts) as executemany batches of
+    ``chunk_size`` in a single transaction.
+
+    These bypass the unit of work's per-object flush, so the dashboard
+    counters are marked stale and recounted on the next read.
+    """
+    with unit_of_work():
+        for start in range(0, len(rows), chunk_size):
+            sess.execute(model.__table__.insert(), rows[start:start + chunk_size])
+        if rows:
+            mark_counters_stale()
+            invalidate_model(model)
+    return len(rows)
+
+def mark_counters_stale():
+    sess.query(DashboardCounter).update({"reconciled_at": datetime.min})
 
 def get_all_doctors():
     total_doctors = (
@@ -27,52 +109,213 @@ def get_all_patients():
 
 def get_all_active_appointments():
     return Appointment.query.filter(
-    Appointment.status.in_(["Booked", "Completed"])).count()
+    Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES)).count()
+
 
+def encode_cursor(values):
+    raw = json.dumps(list(values), default=lambda value: value.isoformat()).encode()
+    return base64.urlsafe_b64encode(raw).decode()
 
-def get_all_registered_doctor_data():
-    return Doctor.query.filter_by(blacklisted=False).all()
+def decode_cursor(cursor, columns):
+    # Cursors come straight from the query string, so anything malformed
+    # just means "start from the first page".
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(columns):
+            return None
+        decoded = []
+        for column, value in zip(columns, values):
+            python_type = column.type.python_type
+            if value is not None and python_type in (date, datetime):
+                value = python_type.fromisoformat(value)
+            elif value is not None and (isinstance(value, bool) or not isinstance(value, python_type)):
+                return None
+            decoded.append(value)
+        return tuple(decoded)
+    except (ValueError, TypeError, NotImplementedError):
+        return None
 
-def get_registered_patients_data():
-    patients = (
-        sess.query(Patient, User).join(User, Patient.user_id == User.id)
-        .all())
-    return patients
+def clamp_page_size(per_page):
+    try:
+        per_page = int(per_page)
+    except (TypeError, ValueError):
+        return PAGE_SIZE
+    return max(1, min(per_page, MAX_PAGE_SIZE))
+
+def seek_ranges(order_columns, cursor, forward):
+    """Filters for the rows after (or before) ``cursor``, as index ranges
+    to read in turn.
+
+    A row-value comparison is never true for NULL, so when the leading
+    column is nullable its NULLs (which SQLite sorts first) are a range of
+    their own rather than an OR that would defeat the index.
+    """
+    lead = order_columns[0]
+    position, bound = tuple_(*order_columns), tuple_(*cursor)
+    if not lead.expression.nullable or len(order_columns) < 2:
+        return [position > bound if forward else position < bound]
+
+    rest, rest_bound = tuple_(*order_columns[1:]), tuple_(*cursor[1:])
+    if cursor[0] is None:
+        if forward:
+            return [and_(lead.is_(None), rest > rest_bound), lead.isnot(None)]
+        return [and_(lead.is_(None), rest < rest_bound)]
+    if forward:
+        return [position > bound]
+    return [position < bound, lead.is_(None)]
+
+def seek_rows(query, ranges, ordering, limit):
+    rows = []
+    for condition in ranges:
+        rows += query.filter(condition).order_by(*ordering).limit(limit - len(rows)).all()
+        if len(rows) == limit:
+            break
+    return rows
+
+def keyset_page(query, order_columns, key, after=None, before=None, per_page=PAGE_SIZE):
+    """Seek-paginate ``query`` on ``order_columns`` (which must end in a
+    unique column) instead of using OFFSET, so every page costs the same
+    regardless of how deep into the table it is.
+
+    ``key`` maps a result row to the cursor tuple for that row.
+    """
+    per_page = clamp_page_size(per_page)
+    after = decode_cursor(after, order_columns)
+    before = decode_cursor(before, order_columns)
+
+    if before is not None:
+        rows = seek_rows(
+            query,
+            seek_ranges(order_columns, before, forward=False),
+            [col.desc() for col in order_columns],
+            per_page + 1
+        )
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_next = True
+    else:
+        if after is None:
+            rows = query.order_by(*order_columns).limit(per_page + 1).all()
+        else:
+            rows = seek_rows(query, seek_ranges(order_columns, after, forward=True), order_columns, per_page + 1)
+        has_next = len(rows) > per_page
+        items = rows[:per_page]
+        has_prev = after is not None
+
+    if not items:
+        return Page(items, None, None)
+
+    return Page(
+        items,
+        encode_cursor(key(items[-1])) if has_next else None,
+        encode_cursor(key(items[0])) if has_prev else None,
+    )
+
+def get_all_registered_doctor_data(after=None, before=None, per_page=PAGE_SIZE):
+    return keyset_page(
+        read_session().query(Doctor).filter_by(blacklisted=False).options(*LOAD_DOCTOR_PROFILE),
+        [Doctor.id],
+        key=lambda doctor: (doctor.id,),
+        after=after, before=before, per_page=per_page
+    )
+
+def get_registered_patients_data(after=None, before=None, per_page=PAGE_SIZE):
+    patients = read_session().query(Patient, User).join(User, Patient.user_id == User.id)
+    return keyset_page(
+        patients,
+        [Patient.id],
+        key=lambda row: (row[0].id,),
+        after=after, before=before, per_page=per_page
+    )
 
-def get_future_appointments():
+def get_future_appointments(after=None, before=None, per_page=PAGE_SIZE):
     appointments = (
-        sess.query(Appointment, Doctor, Patient, User, Department)
+        read_session().query(Appointment, Doctor, Patient, User, Department)
         .join(Doctor, Appointment.doctor_id == Doctor.id)
         .join(Patient, Appointment.patient_id == Patient.id)
         .join(User, Patient.user_id == User.id)
         .outerjoin(Department, Doctor.department_id == Department.id)
         .filter(Doctor.blacklisted == False)
-        .filter(Appointment.status.in_(["Booked", "Completed"]))
-        .all()
+        # Rendered as literals so ix_appointments_active_slot_start applies.
+        .filter(Appointment.status.in_(
+            bindparam("active_statuses", ACTIVE_APPOINTMENT_STATUSES, expanding=True, literal_execute=True)))
+        .options(joinedload(Doctor.user))
+    )
+    return keyset_page(
+        appointments,
+        [Appointment.slot_start, Appointment.id],
+        key=lambda row: (row[0].slot_start, row[0].id),
+        after=after, before=before, per_page=per_page
     )
-    return appointments
 
-def get_appointment_for_patient_view(patient):
+def get_appointment_for_patient_view(patient_id):
     appointments = (
-        db.session.query(Appointment, Doctor, User, Department)
+        read_session().query(Appointment, Doctor, User, Department)
         .join(Doctor, Appointment.doctor_id == Doctor.id)
         .join(User, Doctor.user_id == User.id)
         .outerjoin(Department, Doctor.department_id == Department.id)
-        .filter(Appointment.patient_id == patient.id)
+        .filter(Appointment.patient_id == patient_id)
         .all()
     )
     return appointments
+def get_patient_appointment_rows(patient_id):
+    """Flat columns of a patient's appointments, newest first: the JSON
+    API's counterpart of get_appointment_for_patient_view()."""
+    return (
+        read_session().query(
+            Appointment.id,
+            Appointment.slot_start,
+            Appointment.date,
+            Appointment.time,
+            Appointment.status,
+            Doctor.id.label("doctor_id"),
+            User.username.label("doctor_name"),
+            Department.name.label("department")
+        )
+        .join(Doctor, Appointment.doctor_id == Doctor.id)
+        .join(User, Doctor.user_id == User.id)
+        .outerjoin(Department, Doctor.department_id == Department.id)
+        .filter(Appointment.patient_id == patient_id)
+        .order_by(Appointment.slot_start.desc(), Appointment.id.desc())
+        .all()
+    )
+
+def get_doctor_schedule_rows(doctor_id, since):
+    """Flat columns of a doctor's appointments from ``since`` on: the JSON
+    API's counterpart of get_upcoming_appointments_doc_specific()."""
+    return (
+        read_session().query(
+            Appointment.id,
+            Appointment.slot_start,
+            Appointment.date,
+            Appointment.time,
+            Appointment.status,
+            Patient.id.label("patient_id"),
+            User.username.label("patient_name")
+        )
+        .join(Patient, Appointment.patient_id == Patient.id)
+        .join(User, Patient.user_id == User.id)
+        .filter(
+            Appointment.doctor_id == doctor_id,
+            Appointment.slot_start >= since
+        )
+        .order_by(Appointment.slot_start, Appointment.id)
+        .all()
+    )
+
 def get_upcoming_appointments_doc_specific(doc):
-    today = datetime.now().strftime("%Y-%m-%d")
+    today = datetime.combine(date.today(), datetime.min.time())
     upcoming_appointments = (
-        db.session.query(Appointment, Patient, User)
+        read_session().query(Appointment, Patient, User)
         .join(Patient, Appointment.patient_id == Patient.id)
         .join(User, Patient.user_id == User.id)
         .filter(
             Appointment.doctor_id == doc.id,
-            Appointment.date >= today
+            Appointment.slot_start >= today
         )
-        .order_by(Appointment.date, Appointment.time)
+        .order_by(Appointment.slot_start)
         .all()
     )
     return upcoming_appointments
@@ -80,10 +323,10 @@ def get_upcoming_appointments_doc_specific(doc):
 
 
 def get_doctor(doctor_id):
-    return Doctor.query.get(doctor_id)
+    return Doctor.query.options(*LOAD_DOCTOR_PROFILE).get(doctor_id)
 
 def get_patient(patient_id):
-    return Patient.query.get(patient_id)
+    return Patient.query.options(*LOAD_PATIENT_USER).get(patient_id)
 
 def blacklist_doc(doctor_id):
     doctor = get_doctor(doctor_id)
@@ -102,7 +345,7 @@ def check_user_exists(username, email):
 
 def get_active_patients(doctor_id):
     active_patients = (
-        db.session.query(Patient, User)
+        read_session().query(Patient, User)
         .join(User, Patient.user_id == User.id)
         .join(Appointment, Appointment.patient_id == Patient.id)
         .filter(
@@ -113,18 +356,69 @@ def get_active_patients(doctor_id):
     )
     return active_patients
 
-def query_user_results(search_input):
-    user_results = User.query.filter(
-        (User.username.ilike(f"%{search_input}%")) |
-        (User.email.ilike(f"%{search_input}%"))
-    ).all()
-    return user_results
+def query_user_results(search_input, after=None, before=None, per_page=PAGE_SIZE):
+    user_results = (
+        read_session().query(User).options(*LOAD_USER_PROFILES)
+        .outerjoin(Doctor, Doctor.user_id == User.id)
+        .filter(or_(Doctor.id.is_(None), Doctor.blacklisted == False))
+    )
+    matches = matching_user_ids(search_input)
+    if matches is not None:
+        user_results = user_results.filter(User.id.in_(matches))
+
+    return keyset_page(
+        user_results,
+        [User.id],
+        key=lambda user: (user.id,),
+        after=after, before=before, per_page=per_page
+    )
+
+MAX_NEXT_SLOTS = 50
+
+def next_open_slots_query(department_id, since, until=None, limit=10):
+    slots = (
+        read_session().query(
+            Doctor_availability.doctor_id,
+            User.username,
+            Doctor_availability.date,
+            Doctor_availability.time_slot,
+            Doctor_availability.slot_start
+        )
+        .join(Doctor, Doctor.id == Doctor_availability.doctor_id)
+        .join(User, User.id == Doctor.user_id)
+        .filter(
+            Doctor.department_id == department_id,
+            Doctor.blacklisted == False,
+            Doctor_availability.is_available == True,
+            Doctor_availability.slot_start >= since
+        )
+    )
+    if until is not None:
+        slots = slots.filter(Doctor_availability.slot_start < until)
+
+    limit = max(1, min(limit, MAX_NEXT_SLOTS))
+    return slots.order_by(Doctor_availability.slot_start, Doctor_availability.doctor_id).limit(limit)
+
+def get_next_open_slots(department_id, since, until=None, limit=10):
+    """Earliest open slots across a department's non-blacklisted doctors.
+
+    One query: the department's doctors come off the
+    (department_id, blacklisted) index and each one's open slots off the
+    (doctor_id, is_available, slot_start) range, with SQLite keeping only
+    the top ``limit`` while it merges them.
+    """
+    return next_open_slots_query(department_id, since, until, limit).all()
 
 def get_appointment(appointment_id):
     return Appointment.query.get(appointment_id)
 
 def get_history_records(patient_id):
-    ahh = PatientHistory.query.filter_by(patient_id=patient_id).order_by(PatientHistory.date.desc()).all()
+    ahh = (
+        read_session().query(PatientHistory).options(*LOAD_HISTORY_AUTHOR)
+        .filter_by(patient_id=patient_id)
+        .order_by(PatientHistory.date.desc())
+        .all()
+    )
     return ahh
 
 
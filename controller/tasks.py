@@ -0,0 +1,91 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from controller.counters import reconcile_counters
+from controller.database import db
+from controller.export import DoctorUser, PatientUser, export_lines
+from controller.jobs import enqueue, job
+from controller.model import Patient, Doctor, Appointment
+from controller.slots import parse_date
+
+# Handlers for the jobs the routes queue (see controller.jobs). There is no
+# mail gateway in this app yet, so notifications are written to the
+# "hms.notifications" logger; a real sender would replace notify().
+
+REMINDER_LEAD = timedelta(hours=24)
+
+notifications = logging.getLogger("hms.notifications")
+
+
+def notify(email, message):
+    notifications.info("to=%s %s", email, message)
+    return {"to": email}
+
+
+def appointment_contact(appointment_id):
+    return (
+        db.session.query(
+            Appointment.status, Appointment.date, Appointment.time,
+            PatientUser.username, PatientUser.email, DoctorUser.username
+        )
+        .join(Patient, Patient.id == Appointment.patient_id)
+        .join(PatientUser, PatientUser.id == Patient.user_id)
+        .join(Doctor, Doctor.id == Appointment.doctor_id)
+        .join(DoctorUser, DoctorUser.id == Doctor.user_id)
+        .filter(Appointment.id == appointment_id)
+        .first()
+    )
+
+
+def queue_booking_notices(appointment):
+    """Queue the confirmation now and the reminder REMINDER_LEAD before the
+    appointment (none if that time has already passed). Runs in the
+    booking's transaction."""
+    enqueue("booking_confirmation", appointment_id=appointment.id)
+    if appointment.slot_start is None:
+        return
+    # slot_start is local time; the queue runs on UTC.
+    remind_at = (appointment.slot_start - REMINDER_LEAD).astimezone(timezone.utc).replace(tzinfo=None)
+    if remind_at > datetime.utcnow():
+        enqueue("appointment_reminder", run_at=remind_at, appointment_id=appointment.id)
+
+
+@job("booking_confirmation")
+def send_booking_confirmation(appointment_id):
+    row = appointment_contact(appointment_id)
+    if row is None:
+        return None
+    status, day, slot, patient, email, doctor = row
+    return notify(email, f"Hi {patient}, your appointment with Dr. {doctor} on {day} ({slot}) is {status.lower()}.")
+
+
+@job("appointment_reminder")
+def send_appointment_reminder(appointment_id):
+    row = appointment_contact(appointment_id)
+    if row is None or row.status != "Booked":
+        return None
+    status, day, slot, patient, email, doctor = row
+    return notify(email, f"Reminder: {patient}, you see Dr. {doctor} on {day} ({slot}).")
+
+
+@job("reconcile_counters")
+def reconcile_counters_job():
+    return reconcile_counters()
+
+
+@job("build_export")
+def build_export(dataset, fmt, path, start=None, end=None, doctor_id=None, department_id=None):
+    """Write an export to ``path``; the file appears only once complete."""
+    lines, _ = export_lines(
+        dataset, fmt,
+        start=parse_date(start),
+        end=parse_date(end),
+        doctor_id=doctor_id,
+        department_id=department_id
+    )
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = path + ".part"
+    with open(partial, "w") as handle:
+        handle.writelines(lines)
+    os.replace(partial, path)
+    return {"file": os.path.basename(path), "bytes": os.path.getsize(path)}
@@ -1,8 +1,33 @@
+import math
 import os
-from flask import Flask, render_template,request,redirect,url_for,session,flash
+import click
+from flask import Flask, render_template,request,redirect,url_for,session,flash,abort,jsonify,Response,stream_with_context,send_from_directory
 from datetime import timedelta, datetime
+from controller.config import config
+from controller.database import init_db
 from controller.model import *
 from controller.sql_scripts import *
+from controller.counters import read_counters, reconcile_counters
+from controller.migrations import run_migrations
+from controller.instrumentation import init_profiling, request_metrics
+from controller.cache import cached_fragment, cached_page, configure_cache, render_cache
+from controller.reference_data import (
+    all_departments, department_roster, get_department_ref, get_doctor_ref,
+    load_reference_data, reference_etag
+)
+from controller.api import conditional_json, etag_for, row_dict, rows_etag
+from controller.slot_calendar import doctors_free_at, free_slots
+from controller.bulk_import import IMPORTERS, IMPORT_CHUNK_SIZE, import_file
+from controller.export import DATASETS, EXPORT_FORMATS, export_lines
+from controller.datagen import generate_data
+from controller.events import LONG_POLL_MAX_SECONDS, acquire_waiter, configure_events, event_stream, latest_event_id, prune_events, release_waiter, wait_for_events
+from controller.passwords import PasswordCheckBusy, check_password, configure_passwords, hash_legacy_passwords, hash_password, make_password_hash
+from controller.identity import current_user, init_identity, remember_login, role_required
+from controller.jobs import JOB_POLL_SECONDS, enqueue, job_counts, job_status, prune_jobs, work
+import controller.tasks  # registers the job handlers
+from controller.slots import SLOT_MAP, parse_date, slot_start
+from controller.booking import SlotUnavailable, book_slot, cancel_booking, held_slot_starts
+from controller.availability import AVAILABILITY_DAYS, availability_window, get_open_availability, start_of_today, update_availability
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,6 +36,22 @@ app = Flask(__name__, template_folder='templates', static_folder='static')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = os.getenv('SQLALCHEMY_TRACK_MODIFICATIONS')
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+app.config['COUNTER_RECONCILE_SECONDS'] = os.getenv('COUNTER_RECONCILE_SECONDS', 300)
+app.config['SQLITE_PROFILE'] = os.getenv('SQLITE_PROFILE', config.SQLITE_PROFILE)
+app.config['SQLALCHEMY_READ_URI'] = os.getenv('SQLALCHEMY_READ_URI')
+app.config['READ_ROUTING'] = os.getenv('READ_ROUTING', '1') != '0'
+app.config['PAGE_CACHE_SIZE'] = int(os.getenv('PAGE_CACHE_SIZE', 512))
+app.config['PAGE_CACHE_TTL'] = float(os.getenv('PAGE_CACHE_TTL', 300))
+app.config['PROFILE_REQUESTS'] = os.getenv('PROFILE_REQUESTS', '0') == '1'
+app.config['SLOW_QUERY_MS'] = float(os.getenv('SLOW_QUERY_MS', 100))
+app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+app.config['PASSWORD_HASH_COST'] = os.getenv('PASSWORD_HASH_COST')
+app.config['PASSWORD_VERIFY_WORKERS'] = int(os.getenv('PASSWORD_VERIFY_WORKERS', 4))
+app.config['PASSWORD_VERIFY_QUEUE'] = int(os.getenv('PASSWORD_VERIFY_QUEUE', 16))
+app.config['PASSWORD_VERIFY_WAIT'] = float(os.getenv('PASSWORD_VERIFY_WAIT', 2))
+app.config['IDENTITY_TTL'] = float(os.getenv('IDENTITY_TTL', 60))
+app.config['EVENT_MAX_WAITERS'] = int(os.getenv('EVENT_MAX_WAITERS', 8))
+app.config['EXPORT_DIR'] = os.getenv('EXPORT_DIR', os.path.join(app.instance_path, 'exports'))
 
 @app.route('/')
 def base():
@@ -35,10 +76,15 @@ def registration():
                 error_message="This account already exists. Please log in."
             )
 
+        try:
+            password_hash = make_password_hash(password)
+        except PasswordCheckBusy:
+            return busy_response()
+
         new_user = User(
             username=username,
             email=email,
-            password=password,
+            password=password_hash,
             role=role,
             contact=contact,
             age=age,
@@ -46,32 +92,57 @@ def registration():
         )
 
         #print(f"new user {new_user}")
-        add_record(new_user)
+        with unit_of_work():
+            add_record(new_user)
 
-        patient_profile = Patient(user_id=new_user.id)
-        add_record(patient_profile)
+            patient_profile = Patient(user_id=new_user.id)
+            add_record(patient_profile)
 
         return redirect(url_for('login'))
 
     return render_template('registration.html')
 
+BUSY_MESSAGE = "The server is busy. Please try again in a moment."
+
+
+def busy_response(body=None):
+    """503 with Retry-After for a PasswordCheckBusy; ``body`` defaults to
+    the login page with BUSY_MESSAGE."""
+    if body is None:
+        body = render_template('login.html', error_message=BUSY_MESSAGE)
+    response = app.make_response((body, 503))
+    response.headers["Retry-After"] = "1"
+    return response
+
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
 
-        user = User.query.filter_by(username=username, password=password).first()
-        if not user:
+        # Usernames aren't unique, so the password picks the account.
+        user, new_hash = None, None
+        try:
+            for candidate in User.query.filter_by(username=username).order_by(User.id).all() or [None]:
+                valid, new_hash = check_password(candidate.password if candidate else None, password)
+                if valid:
+                    user = candidate
+                    break
+        except PasswordCheckBusy:
+            return busy_response()
+        if user is None:
             return render_template('login.html', 
                                    error_message="Invalid username or password.")
+        if new_hash:
+            user.password = new_hash
+            db.session.commit()
         if user.role == "doctor" and user.doctor_profile and user.doctor_profile.blacklisted:
             return render_template('login.html',
                                    error_message="Access Denied: You are blacklisted.")
 
-        session['username'] = user.username
-        session['user_id'] = user.id        
-        session['role'] = user.role
+        session.clear()
+        remember_login(user)
 
         if user.role == 'patient':
             return redirect(url_for('patient'))
@@ -83,22 +154,46 @@ def login():
     return render_template('login.html')
     
 
+def admin_page_url(list_name, direction, cursor):
+    # Keep the other lists where they are when paging through one of them.
+    args = request.args.to_dict()
+    args.pop(f"{list_name}_after", None)
+    args.pop(f"{list_name}_before", None)
+    args[f"{list_name}_{direction}"] = cursor
+    return url_for("admin", **args)
+
 @app.route('/admin')
+@role_required("admin")
 def admin():
-    if session.get("role") != "admin":
-        return redirect(url_for("login"))
+
+    args = request.args
+    per_page = args.get("per_page", PAGE_SIZE)
+
+    doctors_page = get_all_registered_doctor_data(
+        args.get("doctors_after"), args.get("doctors_before"), per_page)
+    patients_page = get_registered_patients_data(
+        args.get("patients_after"), args.get("patients_before"), per_page)
+    appointments_page = get_future_appointments(
+        args.get("appointments_after"), args.get("appointments_before"), per_page)
+
+    counters = read_counters()
 
     return render_template(
         "admin.html",
-        total_doctors=get_all_doctors(),
-        total_patients=get_all_patients(),
-        total_appointments=get_all_active_appointments(),
-        registered_doctors=get_all_registered_doctor_data(),
-        registered_patients=get_registered_patients_data(),
-        upcoming_appointments=get_future_appointments(),
+        total_doctors=counters["doctors"],
+        total_patients=counters["patients"],
+        total_appointments=counters["appointments"],
+        registered_doctors=doctors_page.items,
+        registered_patients=patients_page.items,
+        upcoming_appointments=appointments_page.items,
+        doctors_page=doctors_page,
+        patients_page=patients_page,
+        appointments_page=appointments_page,
+        page_url=admin_page_url,
     )
 
 @app.route('/admin/edit_doctor/<int:doctor_id>', methods=['GET', 'POST'])
+@role_required("admin")
 def edit_doctor(doctor_id):
     doc = get_doctor(doctor_id)
     user = doc.user
@@ -121,6 +216,7 @@ def edit_doctor(doctor_id):
 
 
 @app.route('/admin/delete_doctor/<int:doctor_id>', methods=['POST', 'GET'])
+@role_required("admin")
 def delete_doctor(doctor_id):
 
     doc = get_doctor(doctor_id)
@@ -131,6 +227,7 @@ def delete_doctor(doctor_id):
     return redirect(url_for('admin'))
 
 @app.route('/admin/blacklist_doctor/<int:doctor_id>', methods=['POST'])
+@role_required("admin")
 def blacklist_doctor(doctor_id):
 
     blacklist_doc(doctor_id)
@@ -144,6 +241,7 @@ def blacklist_doctor(doctor_id):
 
 
 @app.route('/admin/create_doctor', methods=['GET', 'POST'])
+@role_required("admin")
 def create_doctor():
 
     if request.method == 'POST':
@@ -158,66 +256,157 @@ def create_doctor():
             flash("A doctor already exists with this email", "error")
             return redirect(url_for('create_doctor'))
 
-        department = Department.query.get(department_id)
+        department = get_department_ref(department_id)
         if not department:
             flash("Invalid department selected", "error")
             return redirect(url_for('create_doctor'))
 
+        try:
+            password_hash = make_password_hash("temp123")
+        except PasswordCheckBusy:
+            flash(BUSY_MESSAGE, "error")
+            return busy_response(create_doctor_page())
+
         new_user = User(
             username=username,
             email=email,
-            password="temp123",
+            password=password_hash,
             role="doctor",
             contact=contact
         )
-        add_record(new_user)
+        with unit_of_work():
+            add_record(new_user)
 
-        new_doctor = Doctor(
-            user_id=new_user.id,
-            department_id=department_id,
-            specialization=department.name
-        )
-        add_record(new_doctor)
+            new_doctor = Doctor(
+                user_id=new_user.id,
+                department_id=department_id,
+                specialization=department.name
+            )
+            add_record(new_doctor)
 
         flash("Doctor created successfully!", "success")
         return redirect(url_for('create_doctor'))
 
-    departments = Department.query.all()
-    return render_template('create_doctor.html', departments=departments)
+    return create_doctor_page()
 
 
-@app.route('/admin/admin_search', methods=['GET', 'POST'])
-def admin_search():
+def create_doctor_page():
+    department_options = cached_fragment(
+        "department_options", ("departments",),
+        lambda: render_template('department_options.html', departments=all_departments())
+    )
+    return render_template('create_doctor.html', department_options=department_options)
 
-    if request.method == "POST":
 
-        search_input = request.form.get("search_input", "").strip()
-        user_results = User.query.filter(
-            (User.username.ilike(f"%{search_input}%")) |
-            (User.email.ilike(f"%{search_input}%"))
-        ).all()
+@app.route('/admin/cache')
+@role_required("admin", api=True)
+def admin_cache_stats():
+    return jsonify(render_cache.stats())
 
-        results = []
-        for user in user_results:
-            if user.role == "doctor" and user.doctor_profile:
-                if user.doctor_profile.blacklisted:
 
-                    #print("got inside for and if loop")
-                    continue
+@app.route('/admin/metrics')
+@role_required("admin", api=True)
+def admin_metrics():
+    if request.args.get("format") == "json":
+        return jsonify(enabled=app.config['PROFILE_REQUESTS'], **request_metrics.snapshot())
+    return Response(request_metrics.prometheus(), mimetype="text/plain; version=0.0.4")
 
-            results.append(user)
 
-        return render_template(
-            "admin_search.html",
-            results=results,
-            query=search_input
-        )
+@app.route('/admin/export/<dataset>')
+@role_required("admin")
+def admin_export(dataset):
+    if dataset not in DATASETS:
+        abort(404)
+
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+
+    lines, mimetype = export_lines(
+        dataset, fmt,
+        start=parse_date(request.args.get("from")),
+        end=parse_date(request.args.get("to")),
+        doctor_id=request.args.get("doctor_id", type=int),
+        department_id=request.args.get("department_id", type=int)
+    )
+    return Response(
+        stream_with_context(lines),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={dataset}.{fmt}"}
+    )
+
+
+@app.route('/admin/export/<dataset>/build')
+@role_required("admin", api=True)
+def admin_build_export(dataset):
+    if dataset not in DATASETS:
+        abort(404)
+
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+
+    filename = f"{dataset}-{datetime.now():%Y%m%d-%H%M%S}.{fmt}"
+    job_id = enqueue(
+        "build_export",
+        dataset=dataset, fmt=fmt,
+        path=os.path.join(app.config['EXPORT_DIR'], filename),
+        start=request.args.get("from"),
+        end=request.args.get("to"),
+        doctor_id=request.args.get("doctor_id", type=int),
+        department_id=request.args.get("department_id", type=int)
+    )
+    db.session.commit()
+    return jsonify(job_id=job_id, status_url=url_for("admin_job", job_id=job_id)), 202
+
+
+@app.route('/admin/exports/<path:filename>')
+@role_required("admin")
+def admin_download_export(filename):
+    return send_from_directory(app.config['EXPORT_DIR'], filename, as_attachment=True)
+
+
+@app.route('/admin/jobs')
+@role_required("admin", api=True)
+def admin_jobs():
+    return jsonify(job_counts())
+
+
+@app.route('/admin/jobs/<int:job_id>')
+@role_required("admin", api=True)
+def admin_job(job_id):
+    status = job_status(job_id)
+    if status is None:
+        abort(404)
+    if status["kind"] == "build_export" and status["status"] == "done":
+        status["download_url"] = url_for("admin_download_export", filename=status["result"]["file"])
+    return jsonify(status)
+
+
+@app.route('/admin/admin_search', methods=['GET', 'POST'])
+@role_required("admin")
+def admin_search():
+
+    search_input = request.values.get("search_input", "").strip()
+    page = query_user_results(
+        search_input,
+        request.args.get("after"),
+        request.args.get("before"),
+        request.args.get("per_page", PAGE_SIZE)
+    )
+
+    return render_template(
+        "admin_search.html",
+        results=page.items,
+        page=page,
+        query=search_input
+    )
 
 @app.route('/doctor')
+@role_required("doctor")
 def doctor():
 
-    user_id = session.get("user_id")
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
+    doctor = get_doctor_ref(current_user().profile_id)
 
     if not doctor:
         flash("Doctor profile not found.", "danger")
@@ -242,14 +431,15 @@ def doctor():
     return render_template(
         "doctor.html",
         today_schedule=upcoming_schedule,
-        doctor=doctor.user
+        doctor=current_user()
     )
 
 @app.route('/doctor_availability', methods=['GET', 'POST'])
+@role_required("doctor")
 def doctor_availability():
 
     today = datetime.today()
-    dates = [(today + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7)]
+    dates = [(today + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(AVAILABILITY_DAYS)]
 
     return render_template(
         "doctor_availability.html",
@@ -257,54 +447,41 @@ def doctor_availability():
     )
 
 @app.route("/set_availability", methods=["POST"])
+@role_required("doctor")
 def set_availability():
 
-    if "user_id" not in session or session.get("role") != "doctor":
+    doctor_id = current_user().profile_id
+    if doctor_id is None:
         return redirect(url_for("login"))
 
-    user_id = session["user_id"]
-    doctor = Doctor.query.filter_by(user_id=user_id).first()
-    if not doctor:
-        return redirect(url_for("login"))
-    
-    doctor_id = doctor.id
     selected = request.form.getlist("availability")
 
-    Doctor_availability.query.filter_by(doctor_id=doctor_id).delete()
-
-    slot_map = {
-        "1": "08:00 - 12:00",
-        "2": "12:00 - 16:00",
-        "3": "16:00 - 20:00",
-        "4": "20:00 - 00:00"
-    }
+    wanted = {}
     for slot in selected:
         if "_" in slot:
             date, slot_key = slot.split("_", 1)
-            time_slot = slot_map.get(slot_key, slot_key) # Fallback to key if not found
-            
-            new_entry = Doctor_availability(
-                doctor_id=doctor_id,
-                date=date,
-                time_slot=time_slot,
-                is_available=True
-            )
-            db.session.add(new_entry)
-
+            time_slot = SLOT_MAP.get(slot_key, slot_key) # Fallback to key if not found
+            start = slot_start(date, time_slot)
+            if start is not None:
+                wanted[start] = time_slot
+
+    window_start, window_end = availability_window()
+    update_availability(
+        doctor_id, wanted, window_start, window_end,
+        held=held_slot_starts(doctor_id)
+    )
     db.session.commit()
 
     return redirect(url_for("doctor"))
 
 
 @app.route('/doctor/complete_appointment/<int:appointment_id>')
+@role_required("doctor")
 def complete_appointment(appointment_id):
-    if 'user_id' not in session or session.get('role') != 'doctor':
-        return redirect(url_for('login'))
 
     appt = get_appointment(appointment_id)
 
-    doctor = Doctor.query.filter_by(user_id=session['user_id']).first()
-    if appt.doctor_id != doctor.id:
+    if appt.doctor_id != current_user().profile_id:
         flash("Unauthorized action.", "error")
         return redirect(url_for('doctor'))
 
@@ -315,34 +492,31 @@ def complete_appointment(appointment_id):
 
 
 @app.route('/doctor/cancel_appointment/<int:appointment_id>')
+@role_required("doctor")
 def cancel_appointment_doctor(appointment_id):
-    if 'user_id' not in session or session.get('role') != 'doctor':
-        return redirect(url_for('login'))
 
     appt = get_appointment(appointment_id)
-    doctor = Doctor.query.filter_by(user_id=session['user_id']).first()
-    if appt.doctor_id != doctor.id:
+    if appt.doctor_id != current_user().profile_id:
         flash("Unauthorized action.", "error")
         return redirect(url_for('doctor'))
 
-    appt.status = "Cancelled"
+    cancel_booking(appt)
     db.session.commit()
     flash("Appointment cancelled.", "success")
     return redirect(url_for('doctor'))
 
 @app.route('/doctor/view_history/<int:patient_id>')
+@role_required("doctor")
 def view_history(patient_id):
-    if 'user_id' not in session or session.get('role') != 'doctor':
-        return redirect(url_for('login'))
 
     patient = get_patient(patient_id)
-    patient_user = User.query.get(patient.user_id)
+    patient_user = patient.user
     
     history_records = get_history_records(patient_id)
 
     enriched_history = []
     for record in history_records:
-        doctor_user = User.query.get(record.created_by)
+        doctor_user = record.author
         enriched_history.append({
             "date": record.date.strftime('%Y-%m-%d'),
             "visit_type": record.visit_type,
@@ -361,13 +535,14 @@ def view_history(patient_id):
 
 
 @app.route('/update_history/<int:patient_id>', methods=['GET', 'POST'])
+@role_required("doctor")
 def update_patient_history(patient_id):
 
 
-    if 'user_id' not in session or session.get('role') != 'doctor':
-        return redirect(url_for('login'))
 
-    patient = Patient.query.get_or_404(patient_id)
+    patient = get_patient(patient_id)
+    if not patient:
+        abort(404)
 
     if request.method == "POST":
 
@@ -378,53 +553,39 @@ def update_patient_history(patient_id):
             patient_id = patient_id,
             visit_type = visit_type,
             diagnosis = diagnosis,
-            created_by = session["user_id"]
+            created_by = current_user().id
         )
         add_record(new_history)
         return redirect(url_for("doctor"))
 
-    patient_user = User.query.get(patient.user_id)
-    doctor_user = User.query.get(session['user_id'])
-    doctor_profile = Doctor.query.filter_by(user_id=session['user_id']).first()
-
-    if doctor_profile and doctor_profile.department_id:
-        department = Department.query.get(doctor_profile.department_id)
-    else:
-        department = None
+    patient_user = patient.user
+    doctor_profile = get_doctor_ref(current_user().profile_id)
+    doctor_name = doctor_profile.name if doctor_profile else current_user().username
 
 
     patient_details = {
         "patient_id": patient.id,
         "patient_name": patient_user.username,
-        "doctor_name": doctor_user.username,
-        "department": department.name if department else "N/A"
+        "doctor_name": doctor_name,
+        "department": doctor_profile.department if doctor_profile and doctor_profile.department else "N/A"
     }
 
     return render_template("update_patient_history.html", patient_details=patient_details)
 
 
 @app.route('/patient/dashboard')
+@role_required("patient")
 def patient():
-    user_id = session.get('user_id')
-
-    if not user_id:
-        return redirect('/login')
-
-    user = User.query.filter_by(id=user_id).first()
-
-    if not user:
-        return redirect('/login')
-    if user.role != "patient":
-        return "Access denied. Only patients can access this page.", 403
-
-    patient = Patient.query.filter_by(user_id=user_id).first()
-
-    if not patient:
+    user = current_user()
+    if user.profile_id is None:
         return "Patient profile not found. Please create patient profile.", 400
 
-    departments = Department.query.all()
+    department_list = cached_fragment(
+        "department_list", ("departments",),
+        lambda: render_template('department_list.html', departments=all_departments())
+    )
 
-    appointments = get_appointment_for_patient_view(patient)
+    appointments = get_appointment_for_patient_view(user.profile_id)
 
     formatted_appointments = []
     for appt, doc, doc_user, dept in appointments:
@@ -440,34 +601,251 @@ def patient():
     return render_template(
         "patient.html",
         user=user,
-        patient=patient,
-        departments=departments,
+        department_list=department_list,
         appointments=formatted_appointments
     )
 
 @app.route('/patient/view_doctors/<int:department_id>')
+@cached_page("departments", "doctors")
 def view_doctors(department_id):
 
 
-    department = Department.query.get_or_404(department_id)
-    doctors = (
-        db.session.query(Doctor, User)
-        .join(User, Doctor.user_id == User.id)
-        .filter(Doctor.department_id == department_id, Doctor.blacklisted == False)
-        .all()
-    )
+    department = get_department_ref(department_id)
+    if department is None:
+        abort(404)
+    doctors = department_roster(department_id)
 
     return render_template('view_doctors.html', department=department, doctors=doctors)
 
 
+@app.route('/api/departments/<int:department_id>/next_slots')
+@app.route('/api/v1/departments/<int:department_id>/next_slots')
+@role_required(api=True)
+def next_open_slots(department_id):
+
+    department = get_department_ref(department_id)
+    if department is None:
+        abort(404)
+
+    since = datetime.now()
+    start_day = parse_date(request.args.get('from'))
+    if start_day is not None:
+        since = max(since, datetime.combine(start_day, datetime.min.time()))
+
+    until = None
+    end_day = parse_date(request.args.get('to'))
+    if end_day is not None:
+        until = datetime.combine(end_day + timedelta(days=1), datetime.min.time())
+
+    limit = request.args.get('limit', 10, type=int)
+    slots = get_next_open_slots(department_id, since, until, limit)
+
+    return jsonify(
+        department_id=department.id,
+        department=department.name,
+        slots=[
+            {
+                "doctor_id": doctor_id,
+                "doctor_name": doctor_name,
+                "date": day.isoformat(),
+                "time_slot": time_slot,
+                "slot_start": start.isoformat(),
+                "book_url": url_for('book_appointment', doctor_id=doctor_id)
+            }
+            for doctor_id, doctor_name, day, time_slot, start in slots
+        ]
+    )
+
+
+API_MAX_SLOT_DAYS = 31
+
+
+@app.route('/api/v1/departments')
+@role_required(api=True)
+def api_departments():
+
+    return conditional_json(
+        etag_for("departments", reference_etag()),
+        lambda: {"departments": [department._asdict() for department in all_departments()]}
+    )
+
+
+@app.route('/api/v1/departments/<int:department_id>/doctors')
+@role_required(api=True)
+def api_department_doctors(department_id):
+
+    department = get_department_ref(department_id)
+    if department is None:
+        return jsonify(error="Department not found."), 404
+
+    return conditional_json(
+        etag_for("doctors", reference_etag(), department_id),
+        lambda: {
+            "department": department._asdict(),
+            "doctors": [
+                {"id": doctor.id, "name": doctor.name, "specialization": doctor.specialization}
+                for doctor in department_roster(department_id)
+            ]
+        }
+    )
+
+
+@app.route('/api/v1/departments/<int:department_id>/free_at')
+@role_required(api=True)
+def api_department_free_at(department_id):
+    """Doctors of a department who are free for one slot, e.g.
+    ``?date=2025-01-31&time_slot=08:00 - 12:00`` (or ``time_slot=1``)."""
+
+    department = get_department_ref(department_id)
+    if department is None:
+        return jsonify(error="Department not found."), 404
+
+    day = parse_date(request.args.get('date'))
+    label = request.args.get('time_slot', '')
+    label = SLOT_MAP.get(label, label)
+    start = slot_start(day, label)
+    if start is None:
+        return jsonify(error="date and time_slot are required."), 400
+
+    doctor_ids = doctors_free_at(department_id, day, label) if start > datetime.now() else []
+    doctors = [get_doctor_ref(doctor_id) for doctor_id in doctor_ids]
+    return jsonify(
+        department_id=department.id,
+        date=day.isoformat(),
+        time_slot=label,
+        slot_start=start.isoformat(),
+        doctors=[
+            {
+                "id": doctor.id,
+                "name": doctor.name,
+                "book_url": url_for('book_appointment', doctor_id=doctor.id)
+            }
+            for doctor in doctors if doctor is not None
+        ]
+    )
+
+
+@app.route('/api/v1/doctors/<int:doctor_id>/slots')
+@role_required(api=True)
+def api_doctor_slots(doctor_id):
+
+    doctor = get_doctor_ref(doctor_id)
+    if doctor is None or doctor.blacklisted:
+        return jsonify(error="Doctor not found."), 404
+
+    now = datetime.now()
+    start_day = max(parse_date(request.args.get('from')) or now.date(), now.date())
+    days = min(max(request.args.get('days', AVAILABILITY_DAYS, type=int), 1), API_MAX_SLOT_DAYS)
+
+    # availability_version moves with every change to the doctor's slots;
+    # the hour covers today's slots dropping out as they start.
+    version = db.session.query(Doctor.availability_version).filter_by(id=doctor_id).scalar()
+    etag = etag_for("slots", doctor_id, version, start_day, days, now.strftime("%Y%m%d%H"))
+
+    def build():
+        slots = []
+        for day, label in free_slots(doctor_id, start_day, days):
+            start = slot_start(day, label)
+            if start > now:
+                slots.append({"date": day.isoformat(), "time_slot": label, "slot_start": start.isoformat()})
+        return {"doctor_id": doctor_id, "doctor_name": doctor.name, "slots": slots}
+
+    return conditional_json(etag, build)
+
+
+@app.route('/api/v1/me/appointments')
+@role_required("patient", api=True)
+def api_my_appointments():
+    patient_id = current_user().profile_id
+    if patient_id is None:
+        return jsonify(error="Patient profile not found."), 404
+
+    rows = get_patient_appointment_rows(patient_id)
+    return conditional_json(
+        rows_etag(rows),
+        lambda: {"patient_id": patient_id, "appointments": [row_dict(row) for row in rows]}
+    )
+
+
+@app.route('/api/v1/me/schedule')
+@role_required("doctor", api=True)
+def api_my_schedule():
+    doctor = get_doctor_ref(current_user().profile_id)
+    if doctor is None:
+        return jsonify(error="Doctor profile not found."), 404
+
+    rows = get_doctor_schedule_rows(doctor.id, start_of_today())
+    return conditional_json(
+        rows_etag(rows),
+        lambda: {"doctor_id": doctor.id, "appointments": [row_dict(row) for row in rows]}
+    )
+
+
+def event_subscriber():
+    """(doctor_id, patient_id) whose events the logged-in user may see."""
+    user = current_user()
+    if user.role == 'doctor':
+        return user.profile_id, None
+    if user.role == 'patient':
+        return None, user.profile_id
+    return None, None
+
+
+def last_event_id(doctor_id, patient_id):
+    after = request.headers.get('Last-Event-ID') or request.args.get('after')
+    try:
+        return max(int(after), 0)
+    except (TypeError, ValueError):
+        return latest_event_id(doctor_id, patient_id)
+
+
+@app.route('/events/stream')
+@role_required(api=True)
+def events_stream():
+    doctor_id, patient_id = event_subscriber()
+    if doctor_id is None and patient_id is None:
+        return jsonify(error="No appointments to follow."), 404
+
+    after = last_event_id(doctor_id, patient_id)
+    if not acquire_waiter():
+        response = jsonify(error="Too many open event streams; poll /api/v1/events instead.")
+        response.status_code = 503
+        response.headers["Retry-After"] = "30"
+        return response
+
+    response = Response(
+        stream_with_context(event_stream(after, doctor_id, patient_id)),
+        mimetype="text/event-stream"
+    )
+    response.call_on_close(release_waiter)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route('/api/v1/events')
+@role_required(api=True)
+def api_events():
+    doctor_id, patient_id = event_subscriber()
+    if doctor_id is None and patient_id is None:
+        return jsonify(error="No appointments to follow."), 404
+
+    wait = request.args.get('wait', 0, type=float)
+    if not math.isfinite(wait):
+        return jsonify(error="wait must be a number of seconds."), 400
+
+    after = last_event_id(doctor_id, patient_id)
+    events = wait_for_events(after, min(max(wait, 0), LONG_POLL_MAX_SECONDS), doctor_id, patient_id)
+    return jsonify(events=events, last_id=events[-1]["id"] if events else after)
+
+
 @app.route('/patient/book_appointment/<int:doctor_id>', methods=['GET', 'POST'])
+@role_required("patient")
 def book_appointment(doctor_id):
-    if 'user_id' not in session or session.get('role') != 'patient':
-        return redirect(url_for('login'))
 
-    doctor = Doctor.query.get(doctor_id)
-    doctor_user = User.query.get(doctor.user_id)
-    availabilities = Doctor_availability.query.filter_by(doctor_id=doctor_id, is_available=True).all()
+    doctor = get_doctor(doctor_id)
+    doctor_user = doctor.user
+    availabilities = get_open_availability(doctor)
 
     if request.method == 'POST':
         date_time = request.form.get('date_time') 
@@ -475,31 +853,18 @@ def book_appointment(doctor_id):
             flash("Please select a time slot.", "error")
             return redirect(url_for('book_appointment', doctor_id=doctor_id))
 
-        date, time = date_time.split('_', 1)
+        date, _, time = date_time.partition('_')
+        start = slot_start(date, time)
+        if start is None:
+            flash("Please select a valid time slot.", "error")
+            return redirect(url_for('book_appointment', doctor_id=doctor_id))
         
-        patient = Patient.query.filter_by(user_id=session['user_id']).first()
-
-
-        existing = Appointment.query.filter(
-            Appointment.doctor_id == doctor_id,
-            Appointment.date == date,
-            Appointment.time == time,
-            Appointment.status.in_(["Booked", "Pending"])
-        ).first()
-
-        if existing:
+        try:
+            book_slot(current_user().profile_id, doctor_id, start, time)
+        except SlotUnavailable:
             flash("This slot is already booked. Please choose another.", "error")
             return redirect(url_for('book_appointment', doctor_id=doctor_id))
 
-        new_appt = Appointment(
-            patient_id=patient.id,
-            doctor_id=doctor_id,
-            date=date,
-            time=time,
-            status="Booked"
-        )
-        add_record(new_appt)
-
         flash("Appointment booked successfully, yayyyy!", "success")
         return redirect(url_for('patient'))
 
@@ -507,34 +872,31 @@ def book_appointment(doctor_id):
 
 
 @app.route('/patient/cancel_appointment/<int:appointment_id>')
+@role_required("patient")
 def cancel_appointment(appointment_id):
-    if 'user_id' not in session or session.get('role') != 'patient':
-        return redirect(url_for('login'))
 
     appt = Appointment.query.get_or_404(appointment_id)
-    patient = Patient.query.filter_by(user_id=session['user_id']).first()
-    if appt.patient_id != patient.id:
+    if appt.patient_id != current_user().profile_id:
         flash("Unauthorized action.", "error")
         return redirect(url_for('patient'))
 
-    appt.status = "Cancelled"
+    cancel_booking(appt)
     db.session.commit()
     flash("Appointment cancelled.", "success")
     return redirect(url_for('patient'))
 
 
 @app.route('/patient/history')
+@role_required("patient")
 def patient_history():
-    if 'user_id' not in session or session.get('role') != 'patient':
-        return redirect(url_for('login'))
 
-    patient = Patient.query.filter_by(user_id=session['user_id']).first()
-    history = PatientHistory.query.filter_by(patient_id=patient.id).order_by(PatientHistory.date.desc()).all()
+    patient_id = current_user().profile_id
+    history = PatientHistory.query.filter_by(patient_id=patient_id).order_by(PatientHistory.date.desc()).all()
     past_appointments = (
-        db.session.query(Appointment, Doctor, User)
+        read_session().query(Appointment, Doctor, User)
         .join(Doctor, Appointment.doctor_id == Doctor.id)
         .join(User, Doctor.user_id == User.id)
-        .filter(Appointment.patient_id == patient.id, Appointment.status == "Completed")
+        .filter(Appointment.patient_id == patient_id, Appointment.status == "Completed")
         .all()
     )
 
@@ -542,21 +904,30 @@ def patient_history():
 
 
 @app.route('/patient/edit_profile', methods=['GET', 'POST'])
+@role_required("patient")
 def edit_profile():
-    if 'user_id' not in session or session.get('role') != 'patient':
-        return redirect(url_for('login'))
 
-    user = User.query.get(session['user_id'])
+    user = User.query.get(current_user().id)
 
     if request.method == 'POST':
+        password_hash = None
+        if request.form.get('password'):
+            try:
+                password_hash = make_password_hash(request.form.get('password'))
+            except PasswordCheckBusy:
+                return busy_response(
+                    render_template('edit_profile.html', user=user, error_message=BUSY_MESSAGE))
+
         user.username = request.form.get('username')
         user.email = request.form.get('email')
-        user.password = request.form.get('password')
+        if password_hash:
+            user.password = password_hash
         user.contact = request.form.get('contact')
         user.age = request.form.get('age')
         user.gender = request.form.get('gender')
         
         db.session.commit()
+        remember_login(user)
         flash("Profile updated.", "success")
         return redirect(url_for('patient'))
 
@@ -564,14 +935,113 @@ def edit_profile():
 
 @app.route('/logout')     
 def logout():
-     session.pop('username', None)
+     session.clear()
      return redirect(url_for('base'))
 
 
-db.init_app(app)
+@app.cli.command("prune-events")
+@click.option("--days", default=30, show_default=True, help="keep events newer than this")
+def prune_events_command(days):
+    """Delete appointment events older than --days."""
+    removed = prune_events(datetime.utcnow() - timedelta(days=days))
+    print(f"removed {removed} events")
+
+
+@app.cli.command("worker")
+@click.option("--burst", is_flag=True, help="Exit once no job is due.")
+@click.option("--poll", default=JOB_POLL_SECONDS, show_default=True, help="Seconds between polls when idle.")
+@click.option("--max-jobs", type=int, help="Exit after running this many jobs.")
+def worker_command(burst, poll, max_jobs):
+    """Run queued background jobs."""
+    try:
+        ran = work(burst=burst, poll=poll, max_jobs=max_jobs)
+    except KeyboardInterrupt:
+        return
+    print(f"ran {ran} jobs")
+
+
+@app.cli.command("jobs")
+@click.option("--prune-days", type=int, help="Also delete finished jobs older than this.")
+def jobs_command(prune_days):
+    """Show how many jobs are in each state."""
+    if prune_days is not None:
+        removed = prune_jobs(datetime.utcnow() - timedelta(days=prune_days))
+        print(f"removed {removed} finished jobs")
+    for status, count in sorted(job_counts().items()):
+        print(f"{status}: {count}")
+
+
+@app.cli.command("hash-passwords")
+def hash_passwords_command():
+    """Hash every password still stored in plain text."""
+    print(f"hashed {hash_legacy_passwords()} passwords")
+
+
+@app.cli.command("reconcile-counters")
+def reconcile_counters_command():
+    """Recount the admin dashboard totals from the source tables."""
+    totals = reconcile_counters()
+    for name, value in totals.items():
+        print(f"{name}: {value}")
+
+
+@app.cli.command("export-data")
+@click.argument("dataset", type=click.Choice(sorted(DATASETS)))
+@click.option("--format", "fmt", type=click.Choice(EXPORT_FORMATS), default="csv", show_default=True)
+@click.option("--from", "start", help="First day to include (YYYY-MM-DD).")
+@click.option("--to", "end", help="Last day to include (YYYY-MM-DD).")
+@click.option("--doctor-id", type=int)
+@click.option("--department-id", type=int)
+@click.option("--output", type=click.File("w"), default="-", help="File to write (default: stdout).")
+def export_data_command(dataset, fmt, start, end, doctor_id, department_id, output):
+    """Stream appointments or patient history out as CSV or NDJSON."""
+    lines, _ = export_lines(
+        dataset, fmt,
+        start=parse_date(start),
+        end=parse_date(end),
+        doctor_id=doctor_id,
+        department_id=department_id
+    )
+    output.writelines(lines)
+
+
+@app.cli.command("generate-data")
+@click.option("--patients", default=1000, show_default=True)
+@click.option("--doctors", default=50, show_default=True)
+@click.option("--departments", default=5, show_default=True)
+@click.option("--appointments", default=10000, show_default=True)
+@click.option("--history-per-patient", default=2.0, show_default=True)
+@click.option("--days-ahead", default=14, show_default=True)
+@click.option("--seed", default=1, show_default=True)
+@click.option("--password", default="password", show_default=True)
+def generate_data_command(**options):
+    """Fill the database with deterministic synthetic data for testing."""
+    generate_data(**options)
+
+
+@app.cli.command("import-data")
+@click.argument("kind", type=click.Choice(sorted(IMPORTERS)))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--chunk-size", default=IMPORT_CHUNK_SIZE, show_default=True)
+@click.option("--password-cost", type=int, help="Hash cost for imported passwords (default: PASSWORD_HASH_COST).")
+def import_data_command(kind, path, chunk_size, password_cost):
+    """Bulk-load patients, doctors, availability or appointments from a
+    CSV or JSON Lines file."""
+    stats = import_file(kind, path, chunk_size, progress=lambda stats: print(stats, flush=True),
+                        password_cost=password_cost)
+    print(f"done in {stats.elapsed:.1f}s - {stats}")
+
+
+init_db(app)
+configure_cache(app)
+init_profiling(app)
+configure_passwords(app)
+configure_events(app)
+init_identity(app)
 
 with app.app_context():
     db.create_all()
+    run_migrations()
 
     admin = User.query.filter_by(role='admin').first()
 
@@ -579,7 +1049,7 @@ with app.app_context():
         admin = User(
             username="Superuser",
             email="admin@gmail.com",
-            password="1234567890",
+            password=hash_password("1234567890"),
             role="admin",
             contact="0000000000"
         )
@@ -598,6 +1068,7 @@ with app.app_context():
         db.session.commit()
         print("Departments seeded.")
 
+    load_reference_data()
     print("Database setup complete. Admin user ensured.")
 
 if __name__ == "__main__":
@@ -0,0 +1,60 @@
+"""Shared setup: the app runs against a throwaway SQLite database, created
+before main is imported, and a small synthetic hospital is seeded once per
+test session."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKDIR = tempfile.mkdtemp(prefix="hms_tests_")
+os.environ["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(WORKDIR, "test.sqlite3")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("PAGE_CACHE_SIZE", "0")
+
+from main import app  # noqa: E402
+from controller.database import db  # noqa: E402
+from controller.datagen import generate_data  # noqa: E402
+from controller.model import User, Patient, Doctor, Appointment, PatientHistory  # noqa: E402
+
+PASSWORD = "password"
+ADMIN = ("Superuser", "1234567890")
+
+
+@pytest.fixture(scope="session")
+def seeded():
+    """Usernames and ids of a busy doctor and a patient with history."""
+    with app.app_context():
+        generate_data(patients=30, doctors=6, departments=3, appointments=300,
+                      future_share=0.5, password=PASSWORD, progress=None)
+        doctor_id, doctor = (
+            db.session.query(Doctor.id, User.username)
+            .join(User, User.id == Doctor.user_id)
+            .join(Appointment, Appointment.doctor_id == Doctor.id)
+            .filter(Doctor.blacklisted == False, Appointment.status == "Booked")
+            .group_by(Doctor.id)
+            .order_by(db.func.count().desc())
+            .first()
+        )
+        patient_id, patient = (
+            db.session.query(Patient.id, User.username)
+            .join(User, User.id == Patient.user_id)
+            .join(PatientHistory, PatientHistory.patient_id == Patient.id)
+            .group_by(Patient.id)
+            .having(db.func.count() > 1)
+            .first()
+        )
+    return dict(doctor_id=doctor_id, doctor=doctor, patient_id=patient_id, patient=patient)
+
+
+@pytest.fixture
+def login():
+    def log_in(username, password=PASSWORD):
+        client = app.test_client()
+        response = client.post("/login", data={"username": username, "password": password})
+        assert response.status_code == 302, response.data
+        return client
+    return log_in
@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from conftest import app
+from controller.booking import SlotUnavailable, book_slot
+from controller.database import db
+from controller.model import User, Patient, Appointment, Doctor_availability
+from controller.slot_calendar import free_slots
+
+
+@pytest.fixture
+def open_slot(seeded):
+    """An open future slot of the seeded doctor and two patients' usernames
+    and ids."""
+    with app.app_context():
+        slot = (
+            Doctor_availability.query
+            .filter_by(doctor_id=seeded["doctor_id"], is_available=True)
+            .filter(Doctor_availability.slot_start > datetime.now())
+            .order_by(Doctor_availability.slot_start)
+            .first()
+        )
+        patients = (
+            db.session.query(User.username, Patient.id)
+            .join(Patient, Patient.user_id == User.id)
+            .order_by(Patient.id)
+            .limit(2)
+            .all()
+        )
+        return dict(doctor_id=slot.doctor_id, start=slot.slot_start, label=slot.time_slot, patients=patients)
+
+
+def book(client, slot):
+    return client.post(f"/patient/book_appointment/{slot['doctor_id']}", data={
+        "date_time": f"{slot['start'].date().isoformat()}_{slot['label']}"
+    })
+
+
+def holding(slot):
+    with app.app_context():
+        return Appointment.query.filter_by(
+            doctor_id=slot["doctor_id"], slot_start=slot["start"], status="Booked").all()
+
+
+def is_open(slot):
+    with app.app_context():
+        row = Doctor_availability.query.filter_by(doctor_id=slot["doctor_id"], slot_start=slot["start"]).one()
+        in_calendar = (slot["start"].date(), slot["label"]) in free_slots(slot["doctor_id"], slot["start"].date(), 1)
+        assert row.is_available == in_calendar
+        return row.is_available
+
+
+def test_second_booking_of_a_held_slot_is_rejected(open_slot, login):
+    (first, first_id), (second, _) = open_slot["patients"]
+    book(login(first), open_slot)
+    assert [appointment.patient_id for appointment in holding(open_slot)] == [first_id]
+    assert not is_open(open_slot)
+
+    response = book(login(second), open_slot)
+    assert response.status_code == 302
+    assert [appointment.patient_id for appointment in holding(open_slot)] == [first_id]
+
+    with app.app_context():
+        with pytest.raises(SlotUnavailable):
+            book_slot(first_id, open_slot["doctor_id"], open_slot["start"], open_slot["label"])
+        # The partial unique index backs this up below the application.
+        db.session.add(Appointment(patient_id=first_id, doctor_id=open_slot["doctor_id"],
+                                   date=open_slot["start"].date(), time=open_slot["label"],
+                                   slot_start=open_slot["start"], status="Pending"))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+
+def test_cancelling_reopens_the_slot(open_slot, login):
+    (first, _), (second, second_id) = open_slot["patients"]
+    client = login(first)
+    book(client, open_slot)
+    [appointment] = holding(open_slot)
+
+    client.get(f"/patient/cancel_appointment/{appointment.id}")
+    assert holding(open_slot) == []
+    assert is_open(open_slot)
+
+    book(login(second), open_slot)
+    assert [appointment.patient_id for appointment in holding(open_slot)] == [second_id]
@@ -0,0 +1,70 @@
+from datetime import datetime
+
+from conftest import ADMIN, app
+from controller.counters import COUNTERS, reconcile_counters
+from controller.database import db
+from controller.model import User, Patient, Doctor, Appointment, DashboardCounter, Doctor_availability
+
+
+def stored():
+    with app.app_context():
+        db.session.expire_all()
+        return {row.name: row.value for row in DashboardCounter.query}
+
+
+def recounted():
+    with app.app_context():
+        return {name: count() for name, count in COUNTERS.items()}
+
+
+def other_doctor(seeded):
+    """A bookable doctor other than the seeded one, with active appointments."""
+    with app.app_context():
+        return (
+            db.session.query(Doctor.id)
+            .join(Appointment, Appointment.doctor_id == Doctor.id)
+            .filter(Doctor.blacklisted == False, Doctor.id != seeded["doctor_id"],
+                    Appointment.status.in_(("Booked", "Completed")))
+            .order_by(Doctor.id)
+            .limit(1)
+            .scalar()
+        )
+
+
+def test_counters_follow_book_cancel_blacklist_and_delete(seeded, login):
+    with app.app_context():
+        reconcile_counters()
+        slot = (
+            Doctor_availability.query
+            .filter_by(doctor_id=seeded["doctor_id"], is_available=True)
+            .filter(Doctor_availability.slot_start > datetime.now())
+            .order_by(Doctor_availability.slot_start.desc())
+            .first()
+        )
+        patient = db.session.query(User.username).join(Patient, Patient.user_id == User.id).order_by(Patient.id.desc()).limit(1).scalar()
+        date_time = f"{slot.slot_start.date().isoformat()}_{slot.time_slot}"
+    before = stored()
+
+    client = login(patient)
+    client.post(f"/patient/book_appointment/{seeded['doctor_id']}", data={"date_time": date_time})
+    assert stored()["appointments"] == before["appointments"] + 1
+    assert stored() == recounted()
+
+    with app.app_context():
+        appointment_id = db.session.query(db.func.max(Appointment.id)).scalar()
+    client.get(f"/patient/cancel_appointment/{appointment_id}")
+    assert stored() == before == recounted()
+
+    admin = login(*ADMIN)
+    doctor_id = other_doctor(seeded)
+    admin.post(f"/admin/blacklist_doctor/{doctor_id}")
+    assert stored()["doctors"] == before["doctors"] - 1
+    assert stored() == recounted()
+    admin.post(f"/admin/blacklist_doctor/{doctor_id}")
+    assert stored() == before == recounted()
+
+    admin.post(f"/admin/delete_doctor/{doctor_id}")
+    after = stored()
+    assert after["doctors"] == before["doctors"] - 1
+    assert after["appointments"] < before["appointments"]
+    assert after == recounted()
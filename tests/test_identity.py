@@ -0,0 +1,58 @@
+from conftest import ADMIN, app
+from controller.database import db
+from controller.model import User, Doctor
+
+
+def other_doctor(seeded):
+    with app.app_context():
+        return (
+            db.session.query(Doctor.id, User.username)
+            .join(User, User.id == Doctor.user_id)
+            .filter(Doctor.blacklisted == False, Doctor.id != seeded["doctor_id"])
+            .order_by(Doctor.id.desc())
+            .first()
+        )
+
+
+def test_blacklisted_doctor_is_signed_out_on_next_request(seeded, login):
+    doctor_id, username = other_doctor(seeded)
+    doctor = login(username)
+    assert doctor.get("/doctor").status_code == 200
+
+    login(*ADMIN).post(f"/admin/blacklist_doctor/{doctor_id}")
+    try:
+        response = doctor.get("/doctor")
+        assert response.status_code == 302 and "/login" in response.location
+        with doctor.session_transaction() as session:
+            assert "user_id" not in session
+    finally:
+        login(*ADMIN).post(f"/admin/blacklist_doctor/{doctor_id}")
+
+
+def test_tampered_identity_stamp_is_rejected(seeded, login):
+    client = login(seeded["patient"])
+    assert client.get("/patient/dashboard").status_code == 200
+
+    # The cookie is signed, so a forged one could only get here with the
+    # secret key; even then a stamp that doesn't match the user's row ends
+    # the session at the next revalidation.
+    with client.session_transaction() as session:
+        session["identity_stamp"] = "0" * 32
+        session["identity_checked"] = 0
+    response = client.get("/patient/dashboard")
+    assert response.status_code == 302 and "/login" in response.location
+    with client.session_transaction() as session:
+        assert "user_id" not in session
+
+
+def test_stamp_is_keyed_by_the_secret(seeded):
+    from controller.identity import identity_stamp
+
+    with app.app_context():
+        password = db.session.query(User.password).filter_by(username=seeded["patient"]).scalar()
+        stamp = identity_stamp("patient", password)
+        app.secret_key, secret = "another secret", app.secret_key
+        try:
+            assert identity_stamp("patient", password) != stamp
+        finally:
+            app.secret_key = secret
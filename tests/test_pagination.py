@@ -0,0 +1,39 @@
+from datetime import date
+
+from conftest import app
+from controller.database import db
+from controller.model import Appointment, Doctor
+from controller.sql_scripts import ACTIVE_APPOINTMENT_STATUSES, get_future_appointments
+
+
+def ids(page):
+    return [row[0].id for row in page.items]
+
+
+def test_appointment_pages_cover_every_row_both_ways(seeded):
+    with app.app_context():
+        # Rows whose time label never parsed keep a NULL slot_start.
+        db.session.add_all([
+            Appointment(patient_id=1, doctor_id=seeded["doctor_id"], date=date.today(),
+                        time="whenever", status="Booked")
+            for _ in range(3)
+        ])
+        db.session.commit()
+
+        expected = [
+            id for id, in db.session.query(Appointment.id)
+            .join(Doctor, Doctor.id == Appointment.doctor_id)
+            .filter(Doctor.blacklisted == False, Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES),
+                    Appointment.patient_id.isnot(None))
+            .order_by(Appointment.slot_start.is_(None).desc(), Appointment.slot_start, Appointment.id)
+        ]
+
+        pages = [get_future_appointments(per_page=7)]
+        while pages[-1].next_cursor:
+            pages.append(get_future_appointments(after=pages[-1].next_cursor, per_page=7))
+        assert [id for page in pages for id in ids(page)] == expected
+
+        back = [pages[-1]]
+        while back[-1].prev_cursor:
+            back.append(get_future_appointments(before=back[-1].prev_cursor, per_page=7))
+        assert [ids(page) for page in reversed(back)] == [ids(page) for page in pages]
@@ -0,0 +1,64 @@
+from conftest import app
+from controller.database import db
+from controller.model import User, Patient, Doctor
+from controller.passwords import hash_password, needs_rehash, parse_hash, policy, verify_password
+
+
+def add_user(username, email, password, role="patient"):
+    with app.app_context():
+        user = User(username=username, email=email, password=password, role=role)
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Patient(user_id=user.id) if role == "patient" else Doctor(user_id=user.id, blacklisted=False))
+        db.session.commit()
+        return user.id
+
+
+def stored_password(user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).password
+
+
+def test_hashes_verify():
+    for method, cost in (("scrypt", 1024), ("pbkdf2_sha256", 1000)):
+        stored = hash_password("s3cret", method, cost)
+        assert stored.startswith(f"{method}${cost}$")
+        assert "s3cret" not in stored
+        assert verify_password(stored, "s3cret")
+        assert not verify_password(stored, "S3cret")
+    assert hash_password("s3cret") != hash_password("s3cret")
+
+
+def test_legacy_and_weak_hashes_need_rehash():
+    assert parse_hash("plain-text") is None
+    assert verify_password("plain-text", "plain-text")
+    assert not verify_password("plain-text", "other")
+    assert needs_rehash("plain-text")
+    assert needs_rehash(hash_password("x", policy.method, policy.cost // 2))
+    assert not needs_rehash(hash_password("x"))
+
+
+def test_login_upgrades_legacy_password(login):
+    user_id = add_user("legacy", "legacy@example.com", "old-plain")
+    login("legacy", "old-plain")
+    stored = stored_password(user_id)
+    assert parse_hash(stored)[:2] == tuple(policy)
+    assert verify_password(stored, "old-plain")
+    login("legacy", "old-plain")
+
+
+def test_login_upgrades_cheap_hash(login):
+    user_id = add_user("cheap", "cheap@example.com", hash_password("pw", policy.method, 1024))
+    login("cheap", "pw")
+    assert parse_hash(stored_password(user_id))[:2] == tuple(policy)
+
+
+def test_duplicate_usernames_each_log_in(login):
+    add_user("sam", "sam.patient@example.com", hash_password("patient-pw"))
+    add_user("sam", "sam.doctor@example.com", hash_password("doctor-pw"), role="doctor")
+
+    assert login("sam", "patient-pw").get("/patient/dashboard").status_code == 200
+    assert login("sam", "doctor-pw").get("/doctor").status_code == 200
+
+    response = app.test_client().post("/login", data={"username": "sam", "password": "nope"})
+    assert b"Invalid username or password" in response.data
@@ -0,0 +1,35 @@
+"""Query budgets for the busiest pages, so an N+1 shows up as a failure.
+
+Each page is requested once to warm the per-process reference data and
+again under assert_query_count().
+"""
+from conftest import ADMIN
+from controller.instrumentation import assert_query_count
+
+
+def within_budget(client, url, max_queries):
+    client.get(url)
+    response = assert_query_count(client, url, max_queries)
+    assert response.status_code == 200
+    return response
+
+
+def test_admin_dashboard(seeded, login):
+    within_budget(login(*ADMIN), "/admin", 4)
+
+
+def test_doctor_dashboard(seeded, login):
+    response = within_budget(login(seeded["doctor"]), "/doctor", 1)
+    assert b"view_history" in response.data
+
+
+def test_doctor_view_history(seeded, login):
+    within_budget(login(seeded["doctor"]), f"/doctor/view_history/{seeded['patient_id']}", 2)
+
+
+def test_patient_dashboard(seeded, login):
+    within_budget(login(seeded["patient"]), "/patient/dashboard", 1)
+
+
+def test_patient_history(seeded, login):
+    within_budget(login(seeded["patient"]), "/patient/history", 2)